@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark runner.
+
+Runs the selected benchmarks over synthetic conversations of every shape
+and size, and writes the timings as JSON, so runs on different commits can
+be compared with --compare.
+
+    python3 -m benchmarks -o before.json
+    python3 -m benchmarks -o after.json -c before.json
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+from benchmarks import convgen
+
+suites = ("files", "editor", "history", "logcost", "player", "view", "subtree", "scripts", "scriptpool", "shuffle", "service", "sessions")
+guisuites = ("view", "subtree")
+
+def gitrevision ():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def runsuite (name, conv):
+    module = __import__("benchmarks.%s" % name, fromlist=["run"])
+    try:
+        return module.run(conv)
+    except RecursionError:
+        return {"error": "RecursionError"}
+
+def flatten (results, prefix=()):
+    for key, value in results.items():
+        if isinstance(value, dict):
+            yield from flatten(value, prefix+(key,))
+        else:
+            yield prefix+(key,), value
+
+def compare (old, new):
+    oldvalues = dict(flatten(old["results"]))
+    print("%-60s %12s %12s %8s" % ("benchmark", old.get("revision", "old"), 
+        new.get("revision", "new"), "ratio"))
+    for key, value in flatten(new["results"]):
+        if key[-1] not in ("best", "p50", "p99", "construct", "startconv"):
+            continue
+        if key in oldvalues and oldvalues[key] and isinstance(value, float):
+            print("%-60s %12.6f %12.6f %8.2f" % ("/".join(key), oldvalues[key], 
+                value, value/oldvalues[key]))
+
+def main ():
+    parser = argparse.ArgumentParser(prog="python3 -m benchmarks", 
+        description="Benchmark editor and player hot paths.")
+    parser.add_argument("-s", "--sizes", default="1000,10000",
+        help="comma-separated node counts (default: %(default)s)")
+    parser.add_argument("--guisizes", default="1000,5000",
+        help="node counts for Qt graphics benchmarks (default: %(default)s)")
+    parser.add_argument("--shapes", default=",".join(convgen.shapes),
+        help="comma-separated conversation shapes (default: %(default)s)")
+    parser.add_argument("--suites", default=",".join(suites),
+        help="comma-separated benchmark suites (default: %(default)s)")
+    parser.add_argument("-o", "--output", help="write results to JSON file")
+    parser.add_argument("-c", "--compare", help="compare with earlier JSON results")
+    args = parser.parse_args()
+    
+    results = dict()
+    for suite in args.suites.split(","):
+        sizes = args.guisizes if suite in guisuites else args.sizes
+        for shape in args.shapes.split(","):
+            for size in (int(s) for s in sizes.split(",")):
+                print("%s %s %s..." % (suite, shape, size), file=sys.stderr)
+                conv = convgen.shapes[shape](size)
+                result = runsuite(suite, conv)
+                results.setdefault(suite, dict()).setdefault(shape, dict())[str(size)] = result
+    
+    report = {"revision": gitrevision(), "python": platform.python_version(), 
+        "results": results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
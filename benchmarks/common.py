@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import gc
+import json
+import os
+import sys
+import time
+
+def timed (func, repeat=5):
+    """Run func() repeat times, return best and mean wall time in seconds."""
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {"best": min(times), "mean": sum(times)/len(times)}
+
+def percentiles (samples):
+    """Summary of per-operation latencies in seconds."""
+    samples = sorted(samples)
+    count = len(samples)
+    def pick (p):
+        return samples[min(count-1, int(p*count))]
+    return {"count": count, "mean": sum(samples)/count, "p50": pick(0.5),
+        "p99": pick(0.99), "max": samples[-1]}
+
+class GCCounter (object):
+    """Count garbage collector passes while active."""
+    def __init__ (self):
+        self.collections = 0
+    
+    def callback (self, phase, info):
+        if phase == "start":
+            self.collections += 1
+    
+    def __enter__ (self):
+        gc.callbacks.append(self.callback)
+        return self
+    
+    def __exit__ (self, *exc):
+        gc.callbacks.remove(self.callback)
+
+def writeconv (conv, dirpath, name):
+    filename = os.path.join(dirpath, name)
+    with open(filename, 'w') as f:
+        json.dump(conv, f)
+    return filename
+
+def writeproject (dirpath, convnames, scripts=""):
+    filename = os.path.join(dirpath, "benchmark.proj")
+    with open(filename, 'w') as f:
+        json.dump({"name": "Benchmark", "convs": convnames, "scripts": scripts}, f)
+    return filename
+
+qtapp = None
+
+def headlesswindow ():
+    """Create an EditorWindow on the offscreen Qt platform.
+    
+    The window is needed as FlGlob.mainwindow by every TreeView. Both it and
+    the application are kept alive for the rest of the process."""
+    global qtapp
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    from flint.glob import FlGlob
+    from flint.editorwindow import EditorWindow
+    if qtapp is None:
+        qtapp = QApplication(sys.argv[:1])
+    FlGlob.loglevel = FlGlob.loglevels["quiet"]
+    if FlGlob.mainwindow is None:
+        EditorWindow()
+    return qtapp, FlGlob.mainwindow
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Synthetic conversation generators for benchmarks.
+
+Every generator returns a plain nodes dict, as stored in .conv files, which
+can be fed to NodesContainer directly or written out with json.dump()."""
+
+import random
+
+def convdict (nodes, name="Benchmark"):
+    return {"name": name, "nextID": len(nodes), "nodes": nodes}
+
+def alternate (typename):
+    return "response" if typename == "talk" else "talk"
+
+def tree (count, branching=4, name="Tree"):
+    """Balanced tree of alternating talk/response nodes under a single talk
+    node (ID "1"), so the whole body can be collapsed in one go."""
+    nodes = {"0": {"type": "root", "links": ["1"]},
+             "1": {"type": "talk", "text": "Node 1"}}
+    queue = ["1"]
+    nextID = 2
+    while nextID < count:
+        parentID = queue.pop(0)
+        parent = nodes[parentID]
+        childtype = alternate(parent["type"])
+        links = []
+        for i in range(branching):
+            if nextID >= count:
+                break
+            childID = str(nextID)
+            nodes[childID] = {"type": childtype, "text": "Node %s" % childID}
+            links.append(childID)
+            queue.append(childID)
+            nextID += 1
+        parent["links"] = links
+    return convdict(nodes, name)
+
+def wide (count, name="Wide"):
+    """One talk hub with every other node as a response choice. Each choice
+    leads back to the hub, which shows up as a ghost."""
+    nodes = {"0": {"type": "root", "links": ["1"]},
+             "1": {"type": "talk", "text": "Hub", "links": []}}
+    for i in range(2, count):
+        ID = str(i)
+        nodes[ID] = {"type": "response", "text": "Choice %s" % ID, "links": ["1"]}
+        nodes["1"]["links"].append(ID)
+    return convdict(nodes, name)
+
+def deep (count, name="Deep"):
+    """Single chain of alternating talk/response nodes."""
+    nodes = {"0": {"type": "root", "links": ["1"]}}
+    typename = "talk"
+    for i in range(1, count):
+        ID = str(i)
+        nodes[ID] = {"type": typename, "text": "Node %s" % ID}
+        if i+1 < count:
+            nodes[ID]["links"] = [str(i+1)]
+        typename = alternate(typename)
+    return convdict(nodes, name)
+
+def banks (count, banksize=3, name="Banks"):
+    """Tree where every level is a bank of alternatives, plus one plain
+    node of the same type, in the spirit of randomised barks."""
+    nodes = {"0": {"type": "root", "links": []}}
+    queue = [("0", "talk")]
+    nextID = 1
+    while nextID < count and queue:
+        parentID, childtype = queue.pop(0)
+        links = []
+        
+        bankID = str(nextID)
+        nextID += 1
+        subnodes = []
+        for i in range(banksize):
+            subID = str(nextID)
+            nextID += 1
+            nodes[subID] = {"type": childtype, "nodebank": bankID,
+                "text": "Alternative %s" % subID}
+            subnodes.append(subID)
+        nodes[bankID] = {"type": "bank", "banktype": childtype, 
+            "subnodes": subnodes, "randweight": 1}
+        links.append(bankID)
+        queue.append((bankID, alternate(childtype)))
+        
+        plainID = str(nextID)
+        nextID += 1
+        nodes[plainID] = {"type": childtype, "text": "Node %s" % plainID, "randweight": 1}
+        links.append(plainID)
+        queue.append((plainID, alternate(childtype)))
+        
+        nodes[parentID]["links"] = links
+    return convdict(nodes, name)
+
+def ghosts (count, branching=4, ratio=4, seed=0, name="Ghosts"):
+    """Tree with extra links from leaves back into the tree: every ratio-th
+    node is referenced a second time and drawn as a ghost."""
+    conv = tree(count, branching, name)
+    nodes = conv["nodes"]
+    rng = random.Random(seed)
+    leaves = [ID for ID, nd in nodes.items() if "links" not in nd and ID != "0"]
+    targets = {}
+    for ID, nd in nodes.items():
+        if nd["type"] != "root":
+            targets.setdefault(nd["type"], []).append(ID)
+    for leafID in leaves[:count//ratio]:
+        leaf = nodes[leafID]
+        target = rng.choice(targets[alternate(leaf["type"])])
+        if target != leafID:
+            leaf["links"] = [target]
+    return conv
+
+def collapsible (conv, step=10):
+    """Every step-th link as (refID, ID) pairs, for TreeEditor.collapsednodes."""
+    fullIDs = []
+    for refID, nd in sorted(conv["nodes"].items(), key=lambda i: int(i[0])):
+        for ID in nd.get("links", []):
+            fullIDs.append((int(refID), int(ID)))
+    return fullIDs[::step]
+
+shapes = {"tree": tree, "wide": wide, "deep": deep, "banks": banks, "ghosts": ghosts}
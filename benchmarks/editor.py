@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""TreeEditor traversal and search, without any graphics items."""
+
+import flint.parsers.conv as cp
+from flint.tree_editor import TreeEditor
+from benchmarks.common import timed
+from benchmarks.convgen import collapsible
+
+def run (conv, repeat=5):
+    editor = TreeEditor(cp.NodesContainer(conv))
+    
+    def traverse ():
+        editor.nodeorder.clear()
+        editor.changes.clear()
+        editor.traverse()
+    
+    def retraverse ():
+        editor.changes.clear()
+        editor.traverse()
+    
+    results = {"traverse": timed(traverse, repeat)}
+    results["retraverse"] = timed(retraverse, repeat)
+    editor.collapsednodes = collapsible(conv)
+    results["traverse_collapsed"] = timed(traverse, repeat)
+    editor.collapsednodes = []
+    results["search"] = timed(lambda: editor.search("node 1", {"text": True}), repeat)
+    results["search_all"] = timed(lambda: editor.search("node 1", 
+        {"text": True, "speaker": True, "condname": True, "entername": True}), repeat)
+    
+    linked = editor.nodecontainer.nodes[0].linkIDs
+    if linked:
+        clones = cp.NodesContainer(conv)
+        results["clonesubtree"] = timed(lambda: clones.clonesubtree(linked[0], 
+            source=editor.nodecontainer), repeat)
+    return results
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Conversation file parsing and serialization."""
+
+import os
+import tempfile
+import flint.parsers.conv as cp
+from benchmarks.common import timed, writeconv
+
+def run (conv, repeat=5):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = writeconv(conv, tmpdir, "benchmark.conv")
+        results = {"loadjson": timed(lambda: cp.loadjson(filename), repeat)}
+        cont = cp.loadjson(filename)
+        outfile = os.path.join(tmpdir, "out.conv")
+        results["writejson"] = timed(lambda: cp.writejson(cont, outfile), repeat)
+    return results
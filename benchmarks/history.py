@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Undo history memory over long editing sessions, without a view."""
+
+import time
+import tracemalloc
+import flint.parsers.conv as cp
+from flint.tree_editor import TreeEditor
+
+def edit (editor, steps):
+    nodeID = 0
+    for step in range(steps):
+        kind = step % 4
+        if kind == 0:
+            nodeID = editor.addnode(0, typename="talk")
+        elif kind == 1:
+            editor.setfield(nodeID, "text", "Edited text %s" % step)
+        elif kind == 2:
+            editor.setfield(nodeID, "speaker", "Speaker %s" % step)
+        else:
+            editor.unlink(nodeID, 0)
+
+def typing (editor, steps):
+    nodeID = editor.addnode(0, typename="talk")
+    text = ""
+    for step in range(steps):
+        text += "x"
+        editor.setfield(nodeID, "text", text)
+
+def measure (conv, func, steps):
+    editor = TreeEditor(cp.NodesContainer(conv))
+    start = time.perf_counter()
+    func(editor, steps)
+    results = {"time": time.perf_counter() - start}
+    
+    editor = TreeEditor(cp.NodesContainer(conv))
+    tracemalloc.start()
+    func(editor, steps)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results.update(current=current, peak=peak, 
+        entries=len(editor.undohistory), historysize=editor.undohistory.size)
+    start = time.perf_counter()
+    while editor.undohistory:
+        editor.undohistory.popleft().undo()
+    results["undoall"] = time.perf_counter() - start
+    return results
+
+def run (conv, steps=10000):
+    return {"edit": measure(conv, edit, steps), 
+        "typing": measure(conv, typing, steps)}
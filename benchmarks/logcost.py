@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Cost of filtered-out log calls on the traversal hot path.
+
+Compares log() calls with deferred formatting against formatting the
+message up front, at the default "info" level where both are discarded,
+and times a fresh traverse, which logs its whole change list at "debug"."""
+
+import flint.parsers.conv as cp
+from flint.glob import FlGlob, log
+from flint.tree_editor import TreeEditor
+from benchmarks.common import timed
+
+def run (conv, repeat=5):
+    loglevel = FlGlob.loglevel
+    FlGlob.loglevel = FlGlob.loglevels["info"]
+    editor = TreeEditor(cp.NodesContainer(conv))
+    
+    def traverse ():
+        editor.nodeorder.clear()
+        editor.changes.clear()
+        editor.traverse()
+    
+    traverse()
+    changes = [c for c in editor.changes if c[0] == "newitem"]
+    
+    def deferred ():
+        for name, (fullID, state) in changes:
+            log("verbose", "%s.newitem(%s, %s)", editor, fullID, state)
+        log("debug", "CHANGES %s", changes)
+    
+    def eager ():
+        for name, (fullID, state) in changes:
+            log("verbose", "%s.newitem(%s, %s)" % (editor, fullID, state))
+        log("debug", "CHANGES %s" % changes)
+    
+    results = {"traverse": timed(traverse, repeat)}
+    results["deferred"] = timed(deferred, repeat)
+    results["eager"] = timed(eager, repeat)
+    FlGlob.loglevel = loglevel
+    return results
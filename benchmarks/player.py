@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""ConvPlayer step latency on a seeded random walk through a conversation,
+read straight off the player and as an event stream."""
+
+import random
+import tempfile
+import time
+from flint.conv_player import ConvPlayer
+from benchmarks.common import percentiles, writeconv, writeproject
+
+def walk (player, steps, seed, stream=None):
+    rng = random.Random(seed)
+    player.random.seed(seed)
+    latencies = []
+    restarts = events = 0
+    for i in range(steps):
+        start = time.perf_counter()
+        choices = player.choices()
+        choice = rng.choice(choices) if choices else None
+        if stream is None:
+            player.setcurrentnode(choice)
+        else:
+            stream.choose(choice)
+            for event in stream:
+                events += 1
+        if player.currentnode is None:
+            player.startconv("benchmark.conv")
+            restarts += 1
+        latencies.append(time.perf_counter() - start)
+    return latencies, restarts, events
+
+def run (conv, steps=2000, seed=0):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        writeconv(conv, tmpdir, "benchmark.conv")
+        player = ConvPlayer(writeproject(tmpdir, ["benchmark.conv"]), seed=seed)
+        
+        start = time.perf_counter()
+        player.startconv("benchmark.conv")
+        startup = time.perf_counter() - start
+        latencies, restarts, events = walk(player, steps, seed)
+        nodes = player.steps
+        checks = {"skipped": player.skipped, "evaluated": player.evaluated}
+        
+        player = ConvPlayer(player.projfile)
+        stream = player.stream("benchmark.conv")
+        streamed = walk(player, steps, seed, stream)
+    results = {"startconv": startup, "restarts": restarts, "nodes": nodes, "checks": checks}
+    results["step"] = percentiles(latencies)
+    results["streamed"] = percentiles(streamed[0])
+    results["streamed"]["events"] = streamed[2]
+    return results
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""ConvPlayer steps with scripts in worker processes against in-process.
+
+Every node gets a condition a few levels deep, as in the scripts suite, and
+the player takes the same seeded random walk both ways. The pool's own
+counters show how many calls each round trip carried."""
+
+import copy
+import os
+import random
+import sys
+import tempfile
+import time
+import flint.parsers.proj as pp
+from flint.conv_player import ConvPlayer
+from benchmarks.common import percentiles, writeconv, writeproject
+from benchmarks.scripts import nested, scriptmodule
+
+class PoolPlayer (ConvPlayer):
+    def loadproj (self, projfile):
+        return pp.loadjson(projfile, scriptworkers=2)
+
+def walk (player, steps, seed):
+    player.random.seed(seed)
+    rng = random.Random(seed)
+    player.startconv("benchmark.conv")
+    latencies = []
+    for i in range(steps):
+        start = time.perf_counter()
+        choices = [nd for nd in player.nextlist if nd.visible] if player.nextlist else []
+        player.setcurrentnode(rng.choice(choices) if choices else None)
+        if player.currentnode is None:
+            player.startconv("benchmark.conv")
+        latencies.append(time.perf_counter() - start)
+    return percentiles(latencies)
+
+def run (conv, steps=500, seed=0):
+    conv = copy.deepcopy(conv)
+    for nodeID, nodedict in conv["nodes"].items():
+        if nodeID != "0":
+            nodedict["condition"] = nested(int(nodeID) % 4)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with open(os.path.join(tmpdir, "benchscripts.py"), 'w') as f:
+            f.write(scriptmodule)
+        sys.modules.pop("benchscripts", None)
+        writeconv(conv, tmpdir, "benchmark.conv")
+        projfile = writeproject(tmpdir, ["benchmark.conv"], "benchscripts.py")
+        results = {"inprocess": walk(ConvPlayer(projfile), steps, seed)}
+        
+        start = time.perf_counter()
+        player = PoolPlayer(projfile)
+        results["poolstart"] = time.perf_counter() - start
+        results["pool"] = walk(player, steps, seed)
+        pool = player.proj.scriptpool
+        results["poolstats"] = pool.stats()
+        pool.close()
+        sys.path.remove(tmpdir)
+        sys.modules.pop("benchscripts", None)
+    return results
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Condition evaluation, interpreted against compiled.
+
+Every node of the conversation gets a condition nested a few levels deep,
+alternating and/or so that short-circuiting still walks to the innermost
+level, and all of them are evaluated in turn. The deep cases run a single
+condition nested far deeper than hand-written ones would be, as many times
+as there are nodes.
+
+Reloading the script module of a project is timed against rebinding every
+node's calls, which is what a reload used to cost.
+
+Parsing covers the text form of those conditions: a cold parse of one per
+node, the same texts again from the cache, and typing one in a keystroke at
+a time, where most prefixes do not parse."""
+
+import copy
+import os
+import sys
+import tempfile
+import time
+import flint.parsers.conv as cp
+import flint.parsers.proj as pp
+from benchmarks.common import timed, writeconv, writeproject
+
+flags = {"on"}
+
+def flag (name: str) -> bool:
+    return name in flags
+
+def count (value: int) -> int:
+    return value
+
+scripts = pp.ScriptRegistry({"flag": flag, "count": count})
+
+scriptmodule = """\
+ScriptCalls = dict()
+
+def scriptcall (func):
+    ScriptCalls[func.__name__] = func
+    return func
+
+@scriptcall
+def flag (name: str) -> bool:
+    return name == "on"
+
+@scriptcall
+def count (value: int) -> int:
+    return value
+"""
+
+def script (command, *params, negate=False):
+    call = {"type": "script", "command": command, "params": list(params)}
+    if negate:
+        call["not"] = True
+    return call
+
+def nested (depth, operator="and"):
+    if depth == 0:
+        return {"type": "wrap", "operator": operator, "calls": [script("count", 1)]}
+    if operator == "and":
+        lead, other = script("flag", "on"), "or"
+    else:
+        lead, other = script("flag", "on", negate=True), "and"
+    return {"type": "wrap", "operator": operator, "calls": 
+        [lead, nested(depth-1, other), script("count", depth)]}
+
+def measure (conds, times, repeat):
+    def interpret ():
+        for i in range(times):
+            for cond in conds:
+                cond.interpret()
+    
+    def compiled ():
+        for i in range(times):
+            for cond in conds:
+                cond.run()
+    
+    start = time.perf_counter()
+    for cond in conds:
+        cond.compiled = cond.compile()
+    results = {"compile": time.perf_counter() - start}
+    results["match"] = all(cond.interpret() == cond.run() for cond in conds)
+    results["interpret"] = timed(interpret, repeat)
+    results["compiled"] = timed(compiled, repeat)
+    return results
+
+def reload (conv, repeat):
+    conv = copy.deepcopy(conv)
+    for nodedict in conv["nodes"].values():
+        nodedict["condition"] = nested(2)
+        nodedict["enterscripts"] = [script("count", 1)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with open(os.path.join(tmpdir, "benchscripts.py"), 'w') as f:
+            f.write(scriptmodule)
+        sys.modules.pop("benchscripts", None)
+        filename = writeconv(conv, tmpdir, "benchmark.conv")
+        proj = pp.loadjson(writeproject(tmpdir, ["benchmark.conv"], "benchscripts.py"))
+        cont = cp.loadjson(filename, proj)
+        
+        def evaluate ():
+            for node in cont.nodes.values():
+                node.checkcond()
+                node.runscripts("enter")
+        
+        results = {"reload": timed(proj.reloadscripts, repeat)}
+        results["rebind"] = timed(cont.reinitscripts, repeat)
+        evaluate()
+        proj.reloadscripts()
+        start = time.perf_counter()
+        evaluate()
+        results["firstrun"] = time.perf_counter() - start
+        sys.path.remove(tmpdir)
+        sys.modules.pop("benchscripts", None)
+    return results
+
+def parse (conv, repeat):
+    texts = []
+    for i in range(len(conv["nodes"])):
+        cond = cp.ScriptWrapper(nested(i % 4, ("and", "or")[i % 2]))
+        cond.calls[0].funcparams = ["flag%d" % i]
+        texts.append(cp.scripttotext(cond))
+    
+    def cold ():
+        cp.ScriptParser.cache.clear()
+        for text in texts:
+            cp.parsescript(text)
+    
+    def cached ():
+        for text in texts:
+            cp.parsescript(text)
+    
+    def typing ():
+        cp.ScriptParser.cache.clear()
+        for i in range(len(text)+1):
+            try:
+                cp.parsescript(text[:i])
+            except RuntimeError:
+                pass
+    
+    results = {"cold": timed(cold, repeat), "cached": timed(cached, repeat)}
+    results["chars"] = sum(len(t) for t in texts)
+    text = max(texts[:4], key=len)
+    results["typing"] = timed(typing, repeat)
+    results["keystrokes"] = len(text)+1
+    return results
+
+def run (conv, repeat=5):
+    count = len(conv["nodes"])
+    results = dict()
+    conds = [cp.ScriptWrapper(nested(4), scripts) for i in range(count)]
+    results["nodes"] = measure(conds, 1, repeat)
+    for depth in (16, 64, 256):
+        cond = cp.ScriptWrapper(nested(depth), scripts)
+        results["deep%d" % depth] = measure([cond], count, repeat)
+    results["reload"] = reload(conv, repeat)
+    results["parse"] = parse(conv, repeat)
+    return results
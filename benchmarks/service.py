@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Dialogue service throughput and step latency under concurrent clients.
+
+A DialogueService for the conversation runs in this process, and the
+bundled load generator plays it over localhost TCP from several clients at
+once, each on its own seeded random playthroughs."""
+
+import asyncio
+import tempfile
+from flint.service import DialogueService, loadtest
+from benchmarks.common import writeconv, writeproject
+
+async def measure (projfile, clients, steps):
+    service = DialogueService(projfile)
+    server = await service.start(port=0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        result = await loadtest("127.0.0.1", port, "benchmark.conv", clients, steps)
+    result["server"] = service.stats(None)
+    return result
+
+def run (conv, steps=250):
+    results = dict()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        writeconv(conv, tmpdir, "benchmark.conv")
+        projfile = writeproject(tmpdir, ["benchmark.conv"])
+        for clients in (1, 16):
+            results["clients%d" % clients] = asyncio.run(measure(projfile, clients, steps))
+    return results
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Next lists of many sessions sitting at the same node, one by one against
+refreshnext().
+
+Every node gets a condition and every fifth one is OncePerConv. The
+sessions share one project and conversation, as in the dialogue service,
+and wait at the talk node with the most links. Each has seen one of a few
+sets of that node's children, as a crowd of NPCs running the same barks
+would. One by one is timed on the first hundred sessions only, as it takes
+long on big hubs."""
+
+import copy
+import os
+import random
+import sys
+import tempfile
+from flint.conv_player import NodeDisplay, refreshnext
+from flint.service import DialogueService, SessionPlayer
+from benchmarks.common import timed, writeconv, writeproject
+from benchmarks.scripts import nested, scriptmodule
+
+def crowd (service, nodes, hubID, count, states=4, seed=0):
+    rng = random.Random(seed)
+    linkIDs = nodes[hubID].linkIDs
+    seen = [set(rng.sample(linkIDs, len(linkIDs)//2)) for i in range(states)]
+    players = []
+    for i in range(count):
+        player = SessionPlayer(service, seed=i)
+        player.enterconv("benchmark.conv")
+        player.currentnode = NodeDisplay(nodes[hubID])
+        player.persisttemp.update(rng.choice(seen))
+        players.append(player)
+    return players
+
+def run (conv, counts=(100, 1000), repeat=3, singlecount=100):
+    conv = copy.deepcopy(conv)
+    for nodeID, nodedict in conv["nodes"].items():
+        if nodeID != "0":
+            nodedict["condition"] = nested(int(nodeID) % 4)
+            if int(nodeID) % 5 == 0:
+                nodedict["persistence"] = "OncePerConv"
+    results = dict()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with open(os.path.join(tmpdir, "benchscripts.py"), 'w') as f:
+            f.write(scriptmodule)
+        sys.modules.pop("benchscripts", None)
+        writeconv(conv, tmpdir, "benchmark.conv")
+        service = DialogueService(writeproject(tmpdir, ["benchmark.conv"], "benchscripts.py"))
+        nodes = service.readconv(service.proj.checkpath("benchmark.conv")).nodes
+        hubID = max((nodeobj for nodeobj in nodes.values() if nodeobj.typename == "talk" 
+            and nodeobj.nodebank == -1), key=lambda nodeobj: len(nodeobj.linkIDs)).ID
+        for count in counts:
+            players = crowd(service, nodes, hubID, count)
+            def single ():
+                for player in players[:singlecount]:
+                    player.nextlist = player.getnext(player.currentnode)
+            result = {"single": timed(single, repeat), "batch": timed(lambda: refreshnext(players), repeat)}
+            result["single"]["sessions/s"] = min(count, singlecount) / result["single"]["best"]
+            result["batch"]["sessions/s"] = count / result["batch"]["best"]
+            results["sessions%d" % count] = result
+        sys.path.remove(tmpdir)
+        sys.modules.pop("benchscripts", None)
+    return results
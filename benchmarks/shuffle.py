@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Weighted shuffles of randweight nodes, and whether they come out right.
+
+Every node of the conversation gets a weight and the whole lot is shuffled
+at once, as ConvPlayer.shuffle does with weighted siblings. The same is
+timed for picking one node at a time in proportion to weight, the way the
+player used to, on a slice small enough for its quadratic cost.
+
+Run as a module for the statistical check alone: a few weighted nodes are
+shuffled many times, and the count of each order is compared with its exact
+odds by a chi-squared test.
+
+Usage: python3 -m benchmarks.shuffle [trials]"""
+
+import itertools
+import math
+import random
+import sys
+import tempfile
+from types import SimpleNamespace
+from flint.conv_player import ConvPlayer
+from benchmarks.common import timed, writeproject
+
+def newplayer (tmpdir, seed=0):
+    return ConvPlayer(writeproject(tmpdir, []), seed=seed)
+
+def sequential (rng, ndlist):
+    """One weighted pick at a time out of the rest."""
+    rest = [nd for nd in ndlist if nd.randweight > 0]
+    shuffled = []
+    while rest:
+        r = rng.uniform(0, sum(nd.randweight for nd in rest))
+        ceil = 0
+        for i, nd in enumerate(rest):
+            ceil += nd.randweight
+            if ceil > r:
+                break
+        shuffled.append(rest.pop(i))
+    return shuffled
+
+def orderodds (weights):
+    """Exact odds of every order of range(len(weights))."""
+    odds = dict()
+    for order in itertools.permutations(range(len(weights))):
+        rest = sum(weights)
+        p = 1
+        for i in order:
+            p *= weights[i] / rest
+            rest -= weights[i]
+        odds[order] = p
+    return odds
+
+def chisquared (counts, odds, trials):
+    """Statistic, degrees of freedom and p-value, the latter by the
+    Wilson-Hilferty approximation."""
+    stat = sum((counts.get(order, 0) - p*trials)**2 / (p*trials) for order, p in odds.items())
+    dof = len(odds) - 1
+    z = ((stat/dof)**(1/3) - (1 - 2/(9*dof))) / math.sqrt(2/(9*dof))
+    return {"chi2": stat, "dof": dof, "p": 0.5*math.erfc(z/math.sqrt(2))}
+
+def check (player, weights=(1, 2, 3, 4, 10), trials=100000):
+    nodes = [SimpleNamespace(randweight=w, index=i) for i, w in enumerate(weights)]
+    counts = dict()
+    for t in range(trials):
+        order = tuple(nd.index for nd in player.shuffle(nodes))
+        counts[order] = counts.get(order, 0) + 1
+    return chisquared(counts, orderodds(weights), trials)
+
+def run (conv, repeat=5, slicesize=1000):
+    nodes = [SimpleNamespace(randweight=nd.get("randweight") or 1 + int(nodeID) % 10)
+        for nodeID, nd in conv["nodes"].items() if nodeID != "0"]
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        player = newplayer(tmpdir)
+        results = {"nodes": timed(lambda: player.shuffle(nodes), repeat)}
+        part = nodes[:slicesize]
+        results["slice"] = timed(lambda: player.shuffle(part), repeat)
+        results["slicesequential"] = timed(lambda: sequential(rng, part), repeat)
+    return results
+
+if __name__ == "__main__":
+    trials = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.TemporaryDirectory() as tmpdir:
+        result = check(newplayer(tmpdir), trials=trials)
+        weighted = [SimpleNamespace(randweight=w, index=i) for i, w in enumerate(range(1, 50))]
+        orders = [[nd.index for nd in newplayer(tmpdir, seed=1).shuffle(weighted)] for i in range(2)]
+    replayable = orders[0] == orders[1]
+    print("%d shuffles of 5 nodes: chi2 %.1f on %d degrees of freedom, p = %.3f" % (trials, 
+        result["chi2"], result["dof"], result["p"]))
+    print("same seed, same order: %s" % replayable)
+    sys.exit(0 if result["p"] > 0.001 and replayable else 1)
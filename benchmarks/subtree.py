@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Collapse/uncollapse and unlink/relink a large subtree in a TreeView.
+
+Collapsing hides the subtree items, unlinking removes them from the scene
+and relinking builds them anew.
+
+Usage: python3 -m benchmarks.subtree [nodecount]"""
+
+import sys
+from benchmarks.common import GCCounter, headlesswindow, timed
+from benchmarks.convgen import tree
+
+def run (conv=None, count=5000, repeat=5):
+    app, window = headlesswindow()
+    import flint.parsers.conv as cp
+    from flint.gui.view.treeview import TreeView
+    if conv is None:
+        conv = tree(count)
+    view = TreeView(cp.NodesContainer(conv), parent=window)
+    rootID, subID = 0, 1
+    
+    def collapse ():
+        view.collapse((rootID, subID))
+        view.collapse((rootID, subID))
+    
+    def unlink ():
+        view.unlink(subID, rootID)
+        view.linknode(subID, rootID)
+    
+    results = {}
+    for name, func in (("collapse", collapse), ("unlink", unlink)):
+        with GCCounter() as counter:
+            results[name] = timed(func, repeat)
+        results[name]["gcpasses"] = counter.collections / repeat
+    window.setactiveview(None)
+    view.deleteLater()
+    app.processEvents()
+    return results
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    results = run(count=count)
+    for name in ("collapse", "unlink"):
+        print("%s %s nodes: best %.3fs, mean %.3fs, %.1f GC passes" % (name, 
+            count, results[name]["best"], results[name]["mean"], results[name]["gcpasses"]))
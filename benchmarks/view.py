@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""TreeView construction and update on the offscreen Qt platform."""
+
+import time
+from benchmarks.common import headlesswindow, timed
+
+def run (conv, repeat=3):
+    app, window = headlesswindow()
+    import flint.parsers.conv as cp
+    from flint.gui.view.treeview import TreeView
+    
+    start = time.perf_counter()
+    view = TreeView(cp.NodesContainer(conv), parent=window)
+    results = {"construct": time.perf_counter() - start}
+    results["updateview"] = timed(view.updateview, repeat)
+    results["refresh"] = timed(lambda: view.updateview(refresh=True), repeat)
+    
+    def addnodes (count=100):
+        for i in range(count):
+            view.addnode(0, typename="talk")
+    
+    def bulkadd (count=100):
+        with view.transaction("Add nodes"):
+            addnodes(count)
+    
+    results["addnodes"] = timed(addnodes, 1)
+    results["bulkadd"] = timed(bulkadd, 1)
+    window.setactiveview(None)
+    view.deleteLater()
+    app.processEvents()
+    return results
@@ -16,11 +16,14 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from flint.editorwindow import FlGlob, EditorWindow, log
+import flint.trace as trace
+import logging
 import sys
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import QApplication
 
 app = QApplication(sys.argv)
+tracefile = None
 for arg in sys.argv[1:]:
 	split = arg.split("=", maxsplit=1)
 	argname = split[0]
@@ -28,11 +31,32 @@ for arg in sys.argv[1:]:
 	if argname == "--loglevel":
 		if param in FlGlob.loglevels:
 			FlGlob.loglevel = FlGlob.loglevels[param]
-			log("info", "Loglevel: %s" % param)
+			log("info", "Loglevel: %s", param)
 		else:
-			log("warn", "Unrecognized loglevel: %s" % param)
+			log("warn", "Unrecognized loglevel: %s", param)
+	elif argname == "--stdlogging":
+		FlGlob.stdlogging = True
+		logging.basicConfig(level=logging.NOTSET, format="[%(levelname)s] %(name)s: %(message)s")
 	elif argname == "--icontheme":
 		QIcon.setThemeName(param)
+	elif argname == "--scriptworkers":
+		try:
+			FlGlob.scriptworkers = int(param or 2)
+			log("info", "Running scripts in %s worker processes", FlGlob.scriptworkers)
+		except ValueError:
+			log("warn", "Unrecognized script worker count: %s", param)
+	elif argname == "--scripttimeout":
+		try:
+			FlGlob.scripttimeout = float(param)
+		except (TypeError, ValueError):
+			log("warn", "Unrecognized script timeout: %s", param)
+	elif argname == "--trace":
+		tracefile = param or "flint-trace.json"
+		trace.enable()
+		log("info", "Tracing to: %s", tracefile)
 window = EditorWindow()
 window.show()
-sys.exit(app.exec_())
+ret = app.exec_()
+if tracefile is not None:
+	trace.writetrace(tracefile)
+sys.exit(ret)
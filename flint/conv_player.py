@@ -17,7 +17,15 @@
 
 import flint.parsers.proj as pp
 import flint.parsers.conv as cp
+from flint.trace import (count, traced)
+from flint.glob import FlGlob
+import asyncio
 import random
+from collections import deque
+from contextlib import nullcontext
+from itertools import chain
+from weakref import WeakKeyDictionary
+from flint.scriptprofile import ScriptProfiler
 from PyQt5.QtWidgets import QTextBrowser, QApplication
 from PyQt5.QtCore import pyqtSlot, pyqtSignal, QUrl
 
@@ -51,30 +59,176 @@ class NodeDisplay:
 	def __repr__ (self):
 		return "<%s %s %s>" % (type(self).__name__, self.ids, self.visible)
 
+class PlayerEvent (object):
+	"""Something that happened in a conversation, as read from an
+	EventStream. Events keep references to the player's own NodeDisplays
+	rather than copies."""
+	__slots__ = ("conv",)
+	kind = None
+	
+	def __init__ (self, conv):
+		self.conv = conv
+	
+	def todict (self):
+		return {"kind": self.kind, "conv": self.conv}
+	
+	def __repr__ (self):
+		return "<%s %s>" % (type(self).__name__, self.todict())
+
+def nodedict (nd):
+	return {"ids": nd.ids, "type": nd.typename, "speaker": nd.speaker, 
+		"listener": nd.listener, "text": nd.text}
+
+class LineEvent (PlayerEvent):
+	"""A talk or response node was entered."""
+	__slots__ = ("node",)
+	kind = "line"
+	
+	def __init__ (self, conv, node):
+		self.conv = conv
+		self.node = node
+	
+	def todict (self):
+		return {"kind": self.kind, "conv": self.conv, "node": nodedict(self.node)}
+
+class ChoicesEvent (PlayerEvent):
+	"""The player stopped at a talk node. choices are what can be picked,
+	in order; none means the conversation can only be left. nextlist is
+	everything checked, with failed conditions under diagnostics."""
+	__slots__ = ("node", "nextlist", "choices")
+	kind = "choices"
+	
+	def __init__ (self, conv, node, nextlist, choices):
+		self.conv = conv
+		self.node = node
+		self.nextlist = nextlist
+		self.choices = choices
+	
+	def todict (self):
+		return {"kind": self.kind, "conv": self.conv, "node": self.node.ids,
+			"choices": [nodedict(nd) for nd in self.choices],
+			"failed": [{"ids": nd.ids, "funcname": nd.funcname, "funcpars": nd.funcpars}
+				for nd in self.nextlist or () if not nd.visible]}
+
+class ScriptEvent (PlayerEvent):
+	"""Enter or exit scripts of a node ran."""
+	__slots__ = ("nodeID", "slot")
+	kind = "script"
+	
+	def __init__ (self, conv, nodeID, slot):
+		self.conv = conv
+		self.nodeID = nodeID
+		self.slot = slot
+	
+	def todict (self):
+		return {"kind": self.kind, "conv": self.conv, "node": self.nodeID, "slot": self.slot}
+
+class ConvEvent (PlayerEvent):
+	"""A conversation started, from a trigger in fromconv if any."""
+	__slots__ = ("fromconv",)
+	kind = "conv"
+	
+	def __init__ (self, conv, fromconv):
+		self.conv = conv
+		self.fromconv = fromconv
+	
+	def todict (self):
+		return {"kind": self.kind, "conv": self.conv, "fromconv": self.fromconv}
+
+class EndEvent (PlayerEvent):
+	"""The conversation ended."""
+	__slots__ = ()
+	kind = "end"
+
+STATIC, PERSISTENT, DYNAMIC = range(3)
+VISIBLE = (True, None)
+nodekindcache = WeakKeyDictionary()
+
+def nodekinds (conv, refresh=False):
+	"""How much checking each node of conv takes: STATIC nodes are always
+	visible, PERSISTENT ones unless spent, and only DYNAMIC ones have a
+	condition to run. A bank without a condition of its own counts as a
+	plain node if all its subnodes are STATIC, and as DYNAMIC otherwise.
+	Cached per loaded conversation; refresh after editing conditions or
+	persistence."""
+	if not refresh and conv in nodekindcache:
+		return nodekindcache[conv]
+	kinds = dict()
+	def classify (nodeID):
+		if nodeID in kinds:
+			return kinds[nodeID]
+		nodeobj = conv.nodes[nodeID]
+		kinds[nodeID] = DYNAMIC # until known, in case banks nest in a loop
+		if nodeobj.condition.calls:
+			kind = DYNAMIC
+		elif nodeobj.typename == "bank":
+			subkinds = [classify(subID) for subID in nodeobj.subnodes]
+			kind = STATIC if subkinds and max(subkinds) == STATIC else DYNAMIC
+		else:
+			kind = STATIC
+		if kind == STATIC and nodeobj.persistence:
+			kind = PERSISTENT
+		kinds[nodeID] = kind
+		return kind
+	for nodeID in conv.nodes:
+		classify(nodeID)
+	nodekindcache[conv] = kinds
+	return kinds
+
 class ConvPlayer (object):
-	def __init__ (self, projfile):
+	def __init__ (self, projfile, seed=None, proj=None):
 		self.projfile = projfile
-		self.proj = self.loadproj(projfile)
+		self.random = random.Random(seed) # per session, for replayable runs
+		self.proj = proj if proj is not None else self.loadproj(projfile)
 		self.convs = dict()
 		self.persisttemp = set()
 		self.persistperm = dict()
 		self.currentconv = None
 		self.currentnode = None
 		self.nextlist = None
+		self.profiler = None
+		self.diagnostics = False # check every child, for [FAILED: ...] reports
+		self.stepbudget = 10000 # OPTION: most nodes passed through in one go
+		self.steps = 0 # nodes entered so far
+		self.changes = 0 # script runs and random picks so far
+		self.events = None # queue of PlayerEvents while streamed
+		self.checkmemo = None # condition results shared by refreshnext()
+		self.nodekinds = dict()
+		self.skipped = 0 # checks answered by nodekinds() alone
+		self.evaluated = 0 # checks that ran a condition
+	
+	def profile (self):
+		"""Start timing every script call, attributed to script and node.
+		Conversations loaded later are covered too. Returns the profiler;
+		detach() it to stop."""
+		if self.profiler is None or not self.profiler.registries:
+			self.profiler = ScriptProfiler()
+		self.profiler.attach(self.proj.scripts)
+		for conv in self.convs.values():
+			if conv.proj is not None:
+				self.profiler.attach(conv.proj.scripts)
+		return self.profiler
 	
 	def loadproj (self, projfile):
-		return pp.loadjson(projfile)
+		return pp.loadjson(projfile, scriptworkers=FlGlob.scriptworkers,
+			scripttimeout=FlGlob.scripttimeout)
+	
+	def readconv (self, abspath):
+		return cp.loadjson(abspath, self.proj)
 	
 	def loadconvfile (self, relpath, start=False):
 		abspath = self.proj.checkpath(relpath)
 		if abspath is None:
 			return False
-		conv = cp.loadjson(abspath, self.proj)
+		conv = self.readconv(abspath)
 		self.convs[relpath] = conv
+		self.nodekinds[relpath] = nodekinds(conv)
+		if self.profiler is not None and self.profiler.registries:
+			self.profiler.attach(conv.proj.scripts)
 		if relpath not in self.persistperm:
 			self.persistperm[relpath] = set()
 		if start:
-			self.startconv(relapth)
+			self.startconv(relpath)
 		return True
 	
 	def loadconv (self, conv, start=False):
@@ -84,6 +238,9 @@ class ConvPlayer (object):
 		if self.proj.checkpath(relpath) is None:
 			return False
 		self.convs[relpath] = conv
+		self.nodekinds[relpath] = nodekinds(conv, refresh=True) # may have been edited
+		if self.profiler is not None and self.profiler.registries:
+			self.profiler.attach(conv.proj.scripts)
 		if relpath not in self.persistperm:
 			self.persistperm[relpath] = set()
 		if start:
@@ -91,12 +248,18 @@ class ConvPlayer (object):
 		return True
 	
 	def startconv (self, relpath):
+		self.setcurrentnode(self.enterconv(relpath))
+	
+	def enterconv (self, relpath):
 		if relpath not in self.convs and not self.loadconvfile(relpath):
 			raise RuntimeError("Invalid Conversation path: %s" % relpath)
-		if self.currentconv is not None:
+		fromconv = self.currentconv
+		if fromconv is not None:
 			self.leaveconv()
 		self.currentconv = relpath
-		self.setcurrentnode(NodeDisplay(self.convs[relpath].nodes["0"]))
+		if self.events is not None:
+			self.events.append(ConvEvent(relpath, fromconv))
+		return NodeDisplay(self.convs[relpath].nodes[0])
 	
 	def leaveconv (self):
 		self.persisttemp = set()
@@ -104,47 +267,142 @@ class ConvPlayer (object):
 		self.currentnode = None
 		self.nextlist = None
 	
+	@traced()
 	def setcurrentnode (self, nodedisplay):
-		if nodedisplay is None:
+		"""Enter nodedisplay, then go on through nodes that need no choice
+		(roots, responses, triggers) up to a talk node or the end of the
+		conversation. Raises RuntimeError after self.stepbudget nodes, or
+		on coming back to a node with nothing changed since, which would
+		loop forever."""
+		steps = 0
+		seen = dict()
+		try:
+			while nodedisplay is not None:
+				if steps == self.stepbudget:
+					raise RuntimeError("Passed through %d nodes without stopping" % steps)
+				if self.looping(seen, nodedisplay):
+					raise RuntimeError("Endless loop through node %s" % nodedisplay.ids[-1])
+				steps += 1
+				if self.currentnode:
+					self.runscripts(self.currentnode.ids, "exit")
+				self.currentnode = nodedisplay
+				self.persisttemp.update(nodedisplay.ids)
+				self.persistperm[self.currentconv].update(nodedisplay.ids)
+				self.runscripts(nodedisplay.ids, "enter")
+				if self.events is not None and nodedisplay.typename in ("talk", "response"):
+					self.events.append(LineEvent(self.currentconv, nodedisplay))
+				self.nextlist = self.getnext(nodedisplay)
+				if nodedisplay.typename == "talk":
+					if self.events is not None:
+						self.events.append(ChoicesEvent(self.currentconv, nodedisplay, 
+							self.nextlist, self.choices()))
+					return
+				elif nodedisplay.typename == "trigger":
+					nodedisplay = self.enterconv(nodedisplay.triggerconv)
+				else:
+					nodedisplay = self.nextlist[0] if self.nextlist else None
+			if self.events is not None and self.currentconv is not None:
+				self.events.append(EndEvent(self.currentconv))
 			self.leaveconv()
-			return
-		if self.currentnode:
-			self.runscripts(self.currentnode.ids, "exit")
-		self.currentnode = nodedisplay
-		self.persisttemp.update(nodedisplay.ids)
-		self.persistperm[self.currentconv].update(nodedisplay.ids)
-		self.runscripts(nodedisplay.ids, "enter")
-		self.nextlist = self.getnext(nodedisplay)
-		if nodedisplay.typename == "talk":
-			return
-		elif nodedisplay.typename == "trigger":
-			self.startconv(nodedisplay.triggerconv)
-		else:
-			if self.nextlist:
-				self.setcurrentnode(self.nextlist[0])
-			else:
-				self.leaveconv()
+		finally:
+			self.steps += steps
+			count("player.steps", steps)
+	
+	def choices (self):
+		"""What can be picked at the current node: the visible responses
+		up to the first other visible node, which is picked to go on."""
+		picks = []
+		for nd in self.nextlist or ():
+			if nd.visible:
+				picks.append(nd)
+				if nd.typename != "response":
+					break
+		return picks
+	
+	def stream (self, relpath=None):
+		"""EventStream of what happens from now on, starting relpath first
+		if given."""
+		stream = EventStream(self)
+		if relpath is not None:
+			self.startconv(relpath)
+		return stream
+	
+	def looping (self, seen, nodedisplay):
+		"""Whether entering nodedisplay repeats a state already in seen.
+		Scripts and random picks may change where a walk goes, so only
+		states between them are compared, and only fully on a repeat."""
+		key = (self.currentconv, tuple(nodedisplay.ids), len(self.persisttemp), 
+			len(self.persistperm[self.currentconv]), self.changes)
+		if key not in seen:
+			seen[key] = None
+			return False
+		state = (frozenset(self.persisttemp), [len(s) for s in self.persistperm.values()])
+		if seen[key] == state:
+			return True
+		seen[key] = state
+		return False
 	
 	def runscripts (self, IDlist, slot):
 		nodes = self.convs[self.currentconv].nodes
 		for nodeID in IDlist:
 			nodeobj = nodes[nodeID]
-			if slot == "exit":
-				scripts = nodeobj.exitscripts
-			elif slot == "enter":
-				scripts = nodeobj.enterscripts
-			
-			for script in scripts:
-				script.run()
+			if not (nodeobj.enterscripts if slot == "enter" else nodeobj.exitscripts):
+				continue
+			self.changes += 1
+			if self.profiler is not None:
+				self.profiler.node = (self.currentconv, nodeID)
+			nodeobj.runscripts(slot)
+			if self.events is not None:
+				self.events.append(ScriptEvent(self.currentconv, nodeID, slot))
 
+	def spent (self, nodeobj):
+		if nodeobj.persistence == "OncePerConv" and nodeobj.ID in self.persisttemp:
+			return True
+		elif nodeobj.persistence == "OnceEver" and nodeobj.ID in self.persistperm[self.currentconv]:
+			return True
+		return False
+	
+	def prefetch (self, nodeIDs):
+		"""With scripts running out of process, make the condition calls of
+		nodeIDs, and of the subnodes of banks among them, in one round trip.
+		Returns a context manager to check the nodes in."""
+		conv = self.convs[self.currentconv]
+		pool = conv.proj.scriptpool if conv.proj is not None else None
+		if pool is None:
+			return nullcontext()
+		calls = []
+		stack = list(nodeIDs)
+		while stack:
+			nodeobj = conv.nodes[stack.pop()]
+			if self.spent(nodeobj):
+				continue
+			calls.extend(nodeobj.condition.callsigs())
+			if nodeobj.typename == "bank":
+				stack.extend(nodeobj.subnodes)
+		return pool.batch(calls)
+	
 	def checknode (self, nodeID):
+		kind = self.nodekinds[self.currentconv].get(nodeID, DYNAMIC)
+		if kind == STATIC:
+			self.skipped += 1
+			return VISIBLE
 		nodes = self.convs[self.currentconv].nodes
 		nodeobj = nodes[nodeID]
-		if nodeobj.persistence == "OncePerConv" and nodeID in self.persisttemp:
+		if self.spent(nodeobj):
 			return (False, None)
-		elif nodeobj.persistence == "OnceEver" and nodeID in self.persistperm[self.currentconv]:
-			return (False, None)
-		check = nodeobj.condition.run()
+		if kind == PERSISTENT:
+			self.skipped += 1
+			return VISIBLE
+		self.evaluated += 1
+		if self.profiler is not None:
+			self.profiler.node = (self.currentconv, nodeID)
+		memo = self.checkmemo
+		if memo is None:
+			check = nodeobj.condition.run()
+		elif nodeID in memo:
+			check = memo[nodeID]
+		else:
+			check = memo[nodeID] = nodeobj.condition.run()
 		if check[0] and nodeobj.typename == "bank":
 			retcheck = (False, None)
 			for subID in nodeobj.subnodes:
@@ -155,15 +413,43 @@ class ConvPlayer (object):
 				check = retcheck
 		return check
 	
-	def filternodelist (self, rawlist):
-		showlist = [nd for nd in rawlist if nd.visible] # only nodes that passed checks
-		if not showlist:
-			return []
-		hit = showlist[0]
+	def checkednodes (self, nodeIDs, proxyIDs=None):
+		"""Yield a checked NodeDisplay for each of nodeIDs. Conditions run
+		only as the displays are asked for."""
+		nodes = self.convs[self.currentconv].nodes
+		for nodeID in nodeIDs:
+			nodedisplay = NodeDisplay(nodes[nodeID])
+			nodedisplay.setcheck(self.checknode(nodeID))
+			if proxyIDs:
+				nodedisplay.setproxyIDs(proxyIDs)
+			yield nodedisplay
+	
+	def filternodelist (self, rawnodes, complete=False):
+		"""Pick what to show next out of rawnodes, checked NodeDisplays.
+		Of talk and trigger nodes only the first visible one is ever shown,
+		so unless the pick is random, or complete or self.diagnostics is
+		set, the list ends there and the remaining nodes go unchecked.
+		Returns the list and, when it is to be skipped as a question hub,
+		the node to look past instead."""
+		rawnodes = iter(rawnodes)
+		rawlist = []
+		for nd in rawnodes:
+			rawlist.append(nd)
+			if nd.visible: # first node that passed checks
+				break
+		else:
+			return ([], None)
+		hit = rawlist[-1]
 		nexttype = hit.typename if hit.typename != "bank" else hit.banktype
+		lazy = not (complete or self.diagnostics or hit.randweight)
 		if nexttype in ("talk", "trigger"):
-			typelist = [nd for nd in showlist if nd.typename in ("talk", "trigger") or nd.banktype == "talk"]
+			typelist = (nd for nd in chain((hit,), rawnodes) if nd.visible and 
+				(nd.typename in ("talk", "trigger") or nd.banktype == "talk"))
+			if not lazy:
+				typelist = list(typelist)
 		elif nexttype == "response":
+			lazy = False
+			rawlist.extend(rawnodes)
 			typelist = [nd for nd in rawlist if nd.typename == "response" or nd.banktype == "response"]
 		
 		if hit.randweight:
@@ -171,66 +457,69 @@ class ConvPlayer (object):
 		returnlist = []
 		for nd in typelist:
 			if nd.typename == nexttype:
-				returnlist.append(nd)
+				found = [nd]
 			elif nd.typename == "bank" and nd.visible:
-				returnlist.extend(self.getnextsub(nd))
+				found = self.getnextsub(nd)
+			else:
+				continue
+			returnlist.extend(found)
+			if lazy and any(f.visible for f in found):
+				break
 		qhub = returnlist[0].questionhub
 		if (qhub == "ShowOnce" and any(id in hit.ids for id in self.persisttemp)) or qhub == "ShowNever":
-			return self.getnext(hit, fromhub=True)
+			return (returnlist, hit)
 		else:
-			return returnlist
+			return (returnlist, None)
 	
 	def weightedchoice (self, weightdict):
-		randweights = []
-		weightsum = 0
-		for nd, weight in weightdict.items():
-			weightsum += weight
-			randweights.append((nd, weightsum))
-		r = random.uniform(0, weightsum)
-		for nd, ceil in randweights:
-			if ceil > r:
-				return nd
+		nodes = [nd for nd, weight in weightdict.items() if weight > 0]
+		if not nodes:
+			return None
+		return self.random.choices(nodes, [weightdict[nd] for nd in nodes])[0]
 	
 	def shuffle (self, ndlist):
-		weightdict = dict()
-		for nd in ndlist:
-			if nd.randweight:
-				weightdict[nd] = nd.randweight
-		shuffled = []
-		for nd in weightdict:
-			choice = self.weightedchoice(weightdict)
-			shuffled.append(choice)
-			weightdict[choice] = 0
-		return shuffled
+		"""Random order of the nodes in ndlist with a randweight, heavier
+		ones likelier to come first; the rest are left out. Sorting on
+		exponential keys divided by weight gives every order the same odds
+		as picking the nodes one by one in proportion to weight, in
+		O(n log n) rather than O(n^2)."""
+		weighted = [nd for nd in ndlist if nd.randweight > 0]
+		if not weighted:
+			return weighted
+		self.changes += 1
+		expovariate = self.random.expovariate
+		return sorted(weighted, key=lambda nd: expovariate(1)/nd.randweight)
 	
 	def getnext (self, nodedisplay, fromhub=None):
 		nodes = self.convs[self.currentconv].nodes
-		nodeID = nodedisplay.ids[-1]
-		nodeobj = nodes[nodeID]
-		if nodeobj.nodebank != -1:
-			return self.getnext(NodeDisplay(nodes[nodeobj.nodebank]))
-		rawlist = []
-		for childID in nodeobj.linkIDs:
-			childdisplay = NodeDisplay(nodes[childID])
-			childdisplay.setcheck(self.checknode(childID))
-			if fromhub:
-				childdisplay.setproxyIDs(nodedisplay.ids)
-			rawlist.append(childdisplay)
-		
-		return self.filternodelist(rawlist)
+		seen = set()
+		while True:
+			nodeobj = nodes[nodedisplay.ids[-1]]
+			if nodeobj.nodebank != -1:
+				nodedisplay = NodeDisplay(nodes[nodeobj.nodebank])
+				fromhub = None
+				continue
+			with self.prefetch(nodeobj.linkIDs):
+				proxyIDs = nodedisplay.ids if fromhub else None
+				returnlist, hub = self.filternodelist(self.checkednodes(nodeobj.linkIDs, proxyIDs))
+			if hub is None:
+				return returnlist
+			key = (hub.ids[-1], self.changes)
+			if key in seen or len(seen) == self.stepbudget:
+				raise RuntimeError("Endless loop through question hub %s" % key[0])
+			seen.add(key)
+			nodedisplay = hub
+			fromhub = True
 	
 	def getnextsub (self, nodedisplay):
 		nodes = self.convs[self.currentconv].nodes
 		nodeID = nodedisplay.ids[-1]
 		nodeobj = nodes[nodeID]
-		rawlist = []
-		for subID in nodeobj.subnodes:
-			subdisplay = NodeDisplay(nodes[subID])
-			subdisplay.setcheck(self.checknode(subID))
-			subdisplay.setproxyIDs(nodedisplay.ids)
-			rawlist.append(subdisplay)
-		
-		filterlist = self.filternodelist(rawlist)
+		with self.prefetch(nodeobj.subnodes):
+			filterlist, hub = self.filternodelist(self.checkednodes(nodeobj.subnodes, nodedisplay.ids),
+				complete=nodeobj.bankmode == "Append")
+		if hub is not None:
+			filterlist = self.getnext(hub, fromhub=True)
 		showlist = [nd for nd in filterlist if nd.visible]
 		if nodeobj.bankmode == "First":
 			return [showlist[0]] if showlist else [filterlist[0]]
@@ -242,16 +531,162 @@ class ConvPlayer (object):
 			nd.concattext(text)
 			return [nd]
 
+def statenodes (conv, nodeID):
+	"""IDs of the nodes whose membership in persisttemp and in persistperm
+	can change what getnext() of nodeID returns."""
+	nodes = conv.nodes
+	nodeobj = nodes[nodeID]
+	while nodeobj.nodebank != -1:
+		nodeobj = nodes[nodeobj.nodebank]
+	tempIDs = set()
+	permIDs = set()
+	seen = set()
+	showonce = False
+	stack = list(nodeobj.linkIDs)
+	while stack:
+		nodeID = stack.pop()
+		if nodeID in seen:
+			continue
+		seen.add(nodeID)
+		nodeobj = nodes[nodeID]
+		if nodeobj.persistence == "OncePerConv":
+			tempIDs.add(nodeID)
+		elif nodeobj.persistence == "OnceEver":
+			permIDs.add(nodeID)
+		if nodeobj.typename == "bank":
+			stack.extend(nodeobj.subnodes)
+		if nodeobj.questionhub in ("ShowOnce", "ShowNever"):
+			showonce = showonce or nodeobj.questionhub == "ShowOnce"
+			while nodeobj.nodebank != -1:
+				nodeobj = nodes[nodeobj.nodebank]
+			stack.extend(nodeobj.linkIDs)
+	if showonce: # hubs check every ID a node was reached through
+		tempIDs |= seen
+	return tempIDs, permIDs
+
+def setbits (mask):
+	while mask:
+		low = mask & -mask
+		yield low.bit_length() - 1
+		mask ^= low
+
+def refreshnext (players):
+	"""Recompute the next list of every player, as entering its current
+	node does, for many players at once. Returns the lists in order.
+	
+	Players at the same node of the same loaded conversation are split up
+	by bitsets over them, one per node whose persistence matters there,
+	and each group with the same persistence gets one next list. Scripts
+	are shared by the players of a conversation, so every condition runs
+	once for all of them. Only groups that draw random numbers are
+	evaluated player by player."""
+	results = [None] * len(players)
+	positions = dict()
+	for i, player in enumerate(players):
+		if player.currentnode is not None:
+			conv = player.convs[player.currentconv]
+			key = (id(conv), tuple(player.currentnode.ids), player.diagnostics)
+			positions.setdefault(key, []).append(i)
+	
+	memos = dict()
+	for (convID, ids, diagnostics), indices in positions.items():
+		first = players[indices[0]]
+		tempIDs, permIDs = statenodes(first.convs[first.currentconv], ids[-1])
+		masks = dict()
+		for bit, i in enumerate(indices):
+			player = players[i]
+			for nodeID in tempIDs.intersection(player.persisttemp):
+				masks[nodeID, 0] = masks.get((nodeID, 0), 0) | 1 << bit
+			for nodeID in permIDs.intersection(player.persistperm[player.currentconv]):
+				masks[nodeID, 1] = masks.get((nodeID, 1), 0) | 1 << bit
+		groups = [(1 << len(indices)) - 1]
+		for mask in masks.values():
+			split = []
+			for group in groups:
+				inside = group & mask
+				if inside and inside != group:
+					split.append(inside)
+					split.append(group & ~mask)
+				else:
+					split.append(group)
+			groups = split
+		
+		memo = memos.setdefault(convID, dict())
+		for group in groups:
+			members = [players[indices[bit]] for bit in setbits(group)]
+			shared = None
+			for player in members:
+				player.checkmemo = memo
+				changes = player.changes
+				try:
+					nextlist = shared if shared is not None else player.getnext(player.currentnode)
+				finally:
+					player.checkmemo = None
+				if player.changes == changes:
+					shared = nextlist
+				player.nextlist = nextlist
+		for i in indices:
+			results[i] = players[i].nextlist
+	return results
+
+class EventStream (object):
+	"""Pull-based view of a ConvPlayer as PlayerEvents, for clients that
+	show dialogue as it comes instead of polling the player.
+	
+	At a ChoicesEvent, pick one of its choices with choose() to go on.
+	Iterating yields the events so far, so it stops at every choice; async
+	iteration waits for the choice instead, and only stops once the
+	conversation has ended."""
+	def __init__ (self, player):
+		self.player = player
+		self.queue = player.events = deque()
+		self.chosen = asyncio.Event()
+	
+	def __iter__ (self):
+		while self.queue:
+			yield self.queue.popleft()
+	
+	def __aiter__ (self):
+		return self
+	
+	async def __anext__ (self):
+		while not self.queue:
+			if self.player.currentnode is None:
+				raise StopAsyncIteration
+			self.chosen.clear()
+			await self.chosen.wait()
+		return self.queue.popleft()
+	
+	def choose (self, choice):
+		"""Go on with choice: a NodeDisplay, an index into the current
+		choices, or None to leave the conversation."""
+		if isinstance(choice, int):
+			choices = self.player.choices()
+			if not 0 <= choice < len(choices):
+				raise IndexError("No choice %d" % choice)
+			choice = choices[choice]
+		try:
+			self.player.setcurrentnode(choice)
+		finally:
+			self.chosen.set()
+	
+	def ended (self):
+		return self.player.currentnode is None and not self.queue
+	
+	def close (self):
+		if self.player.events is self.queue:
+			self.player.events = None
+
 class TextPlayer (QTextBrowser):
-	visitedNode = pyqtSignal(str)
-	showedNode = pyqtSignal(str)
+	visitedNode = pyqtSignal(int)
+	showedNode = pyqtSignal(int)
 	closed = pyqtSignal()
 	
-	def __init__ (self, parent, projfile):
+	def __init__ (self, parent, projfile, proj=None):
 		super().__init__(parent)
 		self.setOpenLinks(False)
 		self.anchorClicked.connect(self.activatechoice)
-		self.player = ConvPlayer(projfile)
+		self.player = ConvPlayer(projfile, proj=proj)
 		self.choices = dict()
 	
 	def startconv (self, conv):
@@ -25,26 +25,32 @@ import flint.parsers.proj as pp
 import flint.conv_player as play
 from flint.gui.view.treeview import TreeView
 from flint.gui.view.mapview import MapView
-from flint.gui.style import FlNodeStyle
+from flint.gui.style import (FlNodeStyle, FlPixmaps)
 from flint.gui.textwidgets import TextEditWidget, ScriptWidget
 from flint.gui.propeditwidget import PropertiesEditWidget
 from flint.gui.nodelistwidget import NodeListWidget
 from flint.gui.projectwidget import ProjectWidget
 from flint.glob import (FlGlob, log, elidestring)
+import flint.trace as trace
 
 import os
 import weakref
-from collections import OrderedDict
+from collections import (OrderedDict, Counter)
 import gc
 
 class NodeCopy (object):
-    def __init__ (self, ID=None, view=None, ndict=None):
+    def __init__ (self, ID=None, view=None, ndict=None, subtreeID=None, container=None):
         self.ID = ID
         if view is None:
             self.view = self.blank # self.view needs to be callable
         else:
             self.view = weakref.ref(view)
         self.ndict = ndict
+        self.subtreeID = subtreeID
+        if container is None:
+            self.container = self.blank
+        else:
+            self.container = weakref.ref(container)
     
     def blank (self):
         return None
@@ -57,25 +63,34 @@ class EditorWindow (QMainWindow):
     projects = dict()
     convs = dict()
     activeview = None
-    activenode = ""
-    selectednode = ""
+    activenode = -1
+    selectednode = -1
     newProject = pyqtSignal(str)
     projectUpdated = pyqtSignal(str)
     viewChanged = pyqtSignal()
     viewUpdated = pyqtSignal()
-    activeChanged = pyqtSignal(str)
-    selectedChanged = pyqtSignal(str)
+    activeChanged = pyqtSignal(int)
+    selectedChanged = pyqtSignal(int)
     tempID = 0
+    updateorder = ("layout", "list", "minimap", "docks")
     
     def __init__ (self):
         super().__init__()
         
         FlGlob.mainwindow = self
+        self.dirty = set()
+        self.updaterequests = Counter()
+        self.updateflushes = Counter()
+        self.updatetimer = QTimer(self)
+        self.updatetimer.setSingleShot(True)
+        self.updatetimer.timeout.connect(self.flushupdates)
         self.activeChanged.connect(self.loadnode)
         self.selectedChanged.connect(self.filteractions)
         self.viewChanged.connect(self.filterglobactions)
         
         self.style = FlNodeStyle(QFont())
+        if not FlPixmaps.preload("images", self.style.boldheight): # same paths as the node icons
+            log("info", "No images directory in %s, icons will be blank", os.getcwd())
         self.initactions()
         self.initmenus()
         self.inittoolbars()
@@ -90,6 +105,11 @@ class EditorWindow (QMainWindow):
         
         self.setCentralWidget(tabs)
         self.initdocks()
+        self.updaters = {
+            "layout": self.flushviews,
+            "list": self.viewUpdated.emit,
+            "minimap": self.mapview.update,
+            "docks": self.reloaddocks }
         self.filterglobactions()
         self.filteractions()
     
@@ -130,6 +150,8 @@ class EditorWindow (QMainWindow):
             None, "go-jump", "Center on active node")
         self.actions["selectreal"] = self.createaction("Select &Real", self.selectreal, 
             None, "go-jump", "Select real node")
+        self.actions["showreferences"] = self.createaction("Show Re&ferences", self.showreferences,
+            None, "edit-find", "List nodes linking to this node")
         
         self.actions["newtalk"] = self.createaction("New &Talk Node", self.newtalk,
             (QKeySequence(Qt.ControlModifier+Qt.Key_T)), "insert-object", "Add new Talk node")
@@ -143,6 +165,8 @@ class EditorWindow (QMainWindow):
             (QKeySequence.Copy), "edit-copy", "Copy node")
         self.actions["pasteclone"] = self.createaction("Paste &Clone", self.pasteclone,
             (QKeySequence(Qt.ControlModifier+Qt.ShiftModifier+Qt.Key_V)), "edit-paste", "Paste cloned node")
+        self.actions["pastesubtree"] = self.createaction("Paste S&ubtree", self.pastesubtree,
+            (QKeySequence(Qt.ControlModifier+Qt.AltModifier+Qt.Key_V)), "edit-paste", "Paste copy of node with its subtree")
         self.actions["pastelink"] = self.createaction("Paste &Link", self.pastelink,
             (QKeySequence.Paste), "insert-link", "Paste link to node")
         self.actions["unlinkstree"] = self.createaction("Unlink &Subtree", self.unlink,
@@ -210,6 +234,7 @@ class EditorWindow (QMainWindow):
         
         addmenu = QMenu("Add &link...")
         addmenu.addAction(self.actions["pasteclone"])
+        addmenu.addAction(self.actions["pastesubtree"])
         addmenu.addAction(self.actions["pastelink"])
         addmenu.addSeparator()
         addmenu.addAction(self.actions["newtalk"])
@@ -235,12 +260,13 @@ class EditorWindow (QMainWindow):
         transformmenu.addAction(self.actions["splitnode"])
         self.transformmenu = transformmenu
         
+        historymenusize = 10 # OPTION
         undomenu = QMenu("Undo")
         undomenu.setIcon(QIcon.fromTheme("edit-undo"))
         def generateundo ():
             undomenu.clear()
             undo = self.activeview.undohistory
-            for i in range(len(undo)):
+            for i in range(min(len(undo), historymenusize)):
                 action = undo[i]
                 item = QAction("%s: %s" % (i+1, action.descr), self)
                 item.triggered.connect(self.undofactory(i+1))
@@ -253,7 +279,7 @@ class EditorWindow (QMainWindow):
         def generateredo ():
             redomenu.clear()
             redo = self.activeview.redohistory
-            for i in range(len(redo)):
+            for i in range(min(len(redo), historymenusize)):
                 action = redo[i]
                 item = QAction("%s: %s" % (i+1, action.descr), self)
                 item.triggered.connect(self.redofactory(i+1))
@@ -283,6 +309,7 @@ class EditorWindow (QMainWindow):
         viewmenu.addAction(self.globactions["zoomorig"])
         viewmenu.addAction(self.actions["gotoactive"])
         viewmenu.addAction(self.actions["selectreal"])
+        viewmenu.addAction(self.actions["showreferences"])
         viewmenu.addAction(self.actions["collapse"])
         viewmenu.addAction(self.globactions["refresh"])
         
@@ -329,6 +356,7 @@ class EditorWindow (QMainWindow):
         maptimer = QTimer(self)
         maptimer.timeout.connect(mapview.update)
         maptimer.start(100) # OPTION: mapview frame rate
+        self.mapview = mapview
         mapdock = QDockWidget("Map view", self)
         mapdock.setWidget(mapview)
         
@@ -418,10 +446,10 @@ class EditorWindow (QMainWindow):
             if view.activenode:
                 genericactions += ("gotoactive",)
             if view.selectednode:
-                genericactions += ("collapse", "selectreal")
+                genericactions += ("collapse", "selectreal", "showreferences")
             
             nodes = view.nodecontainer.nodes
-            if self.selectednode and self.selectednode in nodes:
+            if self.selectednode in nodes:
                 nodeobj = nodes[self.selectednode]
                 if self.selectednode not in view.itemindex:
                     if nodeobj.typename != "root":
@@ -431,7 +459,7 @@ class EditorWindow (QMainWindow):
                         "unlinkstree", "settemplate", "nodetobank")
                     if nodeobj.nodebank == -1:
                         actions += ("newtalk", "newresponse", "newbank", "newtrigger",
-                            "pasteclone", "pastelink", "parentswap", "splitnode")
+                            "pasteclone", "pastesubtree", "pastelink", "parentswap", "splitnode")
                 elif nodeobj.typename == "bank":
                     actions = ("copynode", "moveup", "movedown", "unlinknode",
                         "unlinkstree", "pastesubnode", "newbanksub", "settemplate")
@@ -441,12 +469,12 @@ class EditorWindow (QMainWindow):
                         actions += ("newresponsesub",)
                     if nodeobj.nodebank == -1:
                         actions += ("newtalk", "newresponse", "newbank", "newtrigger",
-                            "pasteclone", "pastelink", "parentswap", "splitnode")
+                            "pasteclone", "pastesubtree", "pastelink", "parentswap", "splitnode")
                     if len(nodeobj.subnodes) == 1:
                         actions += ("banktonode",)
                 elif nodeobj.typename == "root":
                     actions = ("newtalk", "newresponse", "newbank", "pasteclone",
-                        "pastelink")
+                        "pastesubtree", "pastelink")
                 elif nodeobj.typename == "trigger":
                     actions = ("copynode", "settemplate", "moveup", "movedown",
                         "unlinknode", "unlinkstree", "nodetobank")
@@ -459,6 +487,12 @@ class EditorWindow (QMainWindow):
                         action.setEnabled(True)
                     else:
                         action.setEnabled(False)
+                elif name == "pastesubtree":
+                    source = self.copiednode.container()
+                    if source is not None and self.copiednode.subtreeID in source.nodes:
+                        action.setEnabled(True)
+                    else:
+                        action.setEnabled(False)
                 elif name == "pastelink":
                     if self.copiednode.view() is view and self.copiednode.ID in view.nodecontainer.nodes: 
                         action.setEnabled(True)
@@ -482,14 +516,14 @@ class EditorWindow (QMainWindow):
             if view.activenode is not None:
                 self.setactivenode(view, view.activenode.realid())
             else:
-                self.setactivenode(view, "-1")
+                self.setactivenode(view, -1)
             if view.selectednode is not None:
                 self.setselectednode(view, view.selectednode.realid())
             else:
-                self.setselectednode(view, "-1")
+                self.setselectednode(view, -1)
         else:
-            self.setactivenode(view, "-1")
-            self.setselectednode(view, "-1")
+            self.setactivenode(view, -1)
+            self.setselectednode(view, -1)
         self.viewChanged.emit()
     
     def setactivenode (self, view, nodeID):
@@ -502,10 +536,43 @@ class EditorWindow (QMainWindow):
         self.selectednode = nodeID
         self.selectedChanged.emit(nodeID)
     
-    @pyqtSlot(str)
+    @pyqtSlot(int)
     def loadnode (self, nodeID):
+        self.scheduleupdate("docks")
+    
+    def reloaddocks (self):
         for dock in self.editdocks.values():
-            dock.widget().loadnode(nodeID)
+            dock.widget().loadnode(self.activenode)
+    
+    def scheduleupdate (self, *names):
+        """Mark subsystems as needing a rebuild.
+        
+        All requests made before control returns to the event loop are
+        served by a single flushupdates() call."""
+        for name in names:
+            self.updaterequests[name] += 1
+            if name in self.dirty:
+                trace.count("update.%s.avoided" % name)
+            self.dirty.add(name)
+        self.updatetimer.start(0)
+    
+    @pyqtSlot()
+    def flushupdates (self):
+        for name in self.updateorder:
+            if name in self.dirty:
+                self.dirty.discard(name)
+                self.updateflushes[name] += 1
+                self.updaters[name]()
+    
+    def flushviews (self):
+        for index in range(self.tabs.count()):
+            self.tabs.widget(index).flushupdates()
+    
+    def updatestats (self):
+        return {name: {"requested": self.updaterequests[name], 
+            "flushed": self.updateflushes[name],
+            "avoided": self.updaterequests[name] - self.updateflushes[name]}
+            for name in self.updateorder}
     
     @pyqtSlot()
     def selectopenfile (self):
@@ -523,14 +590,15 @@ class EditorWindow (QMainWindow):
             return
         
         try:
-            proj = pp.loadjson(filename)
+            proj = pp.loadjson(filename, scriptworkers=FlGlob.scriptworkers,
+                scripttimeout=FlGlob.scripttimeout)
             path = proj.filename
             if path in self.projects:
                 return
             self.projects[path] = proj
             self.newProject.emit(path)
         except Exception as e:
-            log("error", "Failed loading %s: %s" % (filename, repr(e)))
+            log("error", "Failed loading %s: %r", filename, e)
     
     @pyqtSlot()
     def newproj (self):
@@ -544,7 +612,7 @@ class EditorWindow (QMainWindow):
                 self.newProject.emit(proj.filename)
                 proj.savetofile()
             except Exception as e:
-                log("error", "Failed creating project: %s" % repr(e))
+                log("error", "Failed creating project: %r", e)
     
     @pyqtSlot()
     def reloadscripts (self):
@@ -552,20 +620,8 @@ class EditorWindow (QMainWindow):
         if projfile is None:
             return
         proj = self.projects[projfile]
-        proj.reloadscripts()
-        for conv in proj.convs:
-            abspath = proj.checkpath(conv)
-            if abspath and abspath in self.convs:
-                view = self.convs[abspath]()
-                view.nodecontainer.reinitscripts()
-                if view is self.activeview:
-                    view.updateview()
-        for conv in proj.tempconvs:
-            if conv in self.convs:
-                view = self.convs[abspath]()
-                view.nodecontainer.reinitscripts()
-                if view is self.activeview:
-                    view.updateview()
+        proj.reloadscripts() # open conversations pick up the new functions lazily
+        self.scheduleupdate("docks")
     
     def openconvfile (self, filename):
         try:
@@ -580,7 +636,7 @@ class EditorWindow (QMainWindow):
             treeview = TreeView(cont, parent=self)
             self.newtab(treeview)
         except Exception as e:
-            log("error", "Failed opening %s: %s" % (filename, repr(e)))
+            log("error", "Failed opening %s: %r", filename, e)
     
     def openconv (self, projfile, relpath):
         proj = self.projects[projfile]
@@ -590,9 +646,9 @@ class EditorWindow (QMainWindow):
                 view = self.convs[relpath]()
                 self.tabs.setCurrentWidget(view)
             else:
-                log("error", "Temprorary ID invalid: %s" % relpath)
+                log("error", "Temprorary ID invalid: %s", relpath)
         elif abspath is None:
-            log("error", "Not part of project or no such file: %s" % relpath)
+            log("error", "Not part of project or no such file: %s", relpath)
         elif abspath in self.convs:
             view = self.convs[abspath]()
             if view is not None:
@@ -605,7 +661,7 @@ class EditorWindow (QMainWindow):
                 else:
                     self.tabs.setCurrentWidget(view)
             else:
-                log("error", "Conversation no longer open: %s" % abspath)
+                log("error", "Conversation no longer open: %s", abspath)
         else:
             cont = cp.loadjson(abspath, proj)
             treeview = TreeView(cont, parent=self)
@@ -629,7 +685,7 @@ class EditorWindow (QMainWindow):
     def newtab (self, treeview):
         name = treeview.nodecontainer.name
         filename = treeview.nodecontainer.filename
-        log("debug", "newtab %s" % filename)
+        log("debug", "newtab %s", filename)
         if filename:
             viewid = filename
         else:
@@ -657,7 +713,7 @@ class EditorWindow (QMainWindow):
     def saveconv (self, convID, newfile=False):
         view = self.convs.get(convID)()
         if view is None:
-            log("error", "Unknown conversation: %s" % convID)
+            log("error", "Unknown conversation: %s", convID)
         cont = view.nodecontainer
         if not cont.filename or convID.startswith("\0TEMP") or newfile:
             filename = QFileDialog.getSaveFileName(self, "Save as...", 
@@ -730,7 +786,7 @@ class EditorWindow (QMainWindow):
         view = self.activeview
         proj = view.nodecontainer.proj
         projfile = proj.filename
-        player = play.TextPlayer(self, projfile)
+        player = play.TextPlayer(self, projfile, proj) # shares the project's script pool
         player.setWindowFlags(Qt.Dialog)
         view.setplaymode(True)
         player.showedNode.connect(view.playshowID)
@@ -772,6 +828,13 @@ class EditorWindow (QMainWindow):
         nodeID = view.selectednode.realid()
         view.setselectednode(view.itembyID(nodeID))
     
+    @pyqtSlot()
+    def showreferences (self):
+        view = self.activeview
+        nodeID = view.selectednode.realid()
+        self.listdock.widget().showreferences(nodeID)
+        self.listdock.raise_()
+    
     @pyqtSlot()
     def refresh (self):
         view = self.activeview
@@ -837,11 +900,14 @@ class EditorWindow (QMainWindow):
         nodedict["subnodes"] = []
         
         if nodeobj.nodebank != -1 or nodeobj.ID in view.trash:
-            self.copiednode = NodeCopy(ID=None, view=None, ndict=nodedict)
+            self.copiednode = NodeCopy(ID=None, view=None, ndict=nodedict,
+                subtreeID=nodeobj.ID, container=view.nodecontainer)
         else:
-            self.copiednode = NodeCopy(ID=nodeobj.ID, view=view, ndict=nodedict)
+            self.copiednode = NodeCopy(ID=nodeobj.ID, view=view, ndict=nodedict,
+                subtreeID=nodeobj.ID, container=view.nodecontainer)
         
         self.actions["pasteclone"].setText("Paste &Clone (node %s)" % nodeobj.ID)
+        self.actions["pastesubtree"].setText("Paste S&ubtree (node %s)" % nodeobj.ID)
         self.actions["pastelink"].setText("Paste &Link (node %s)" % nodeobj.ID)
         self.actions["pastesubnode"].setText("&Paste Subnode (node %s)" % nodeobj.ID)
         self.filteractions()
@@ -865,6 +931,19 @@ class EditorWindow (QMainWindow):
         nodeID = view.selectednode.realid()
         view.addnode(nodeID, ndict=self.copiednode.ndict)
     
+    @pyqtSlot()
+    def pastesubtree (self):
+        view = self.activeview
+        refID = view.selectednode.realid()
+        copied = self.copiednode
+        source = copied.container()
+        if source is None or copied.subtreeID not in source.nodes:
+            return
+        try:
+            view.pastesubtree(copied.subtreeID, refID, source)
+        except RuntimeError as e:
+            log("error", "Failed pasting subtree: %r", e)
+    
     @pyqtSlot()
     def pastelink (self):
         view = self.activeview
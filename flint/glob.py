@@ -15,21 +15,45 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import logging
+
 class FlGlob:
     loglevels = {"quiet": 0, "error": 1, "warn": 2, "info": 3, "debug": 4, "verbose": 5}
     loglevel = 3
+    stdlogging = False
     mainwindow = None
+    scriptworkers = 0
+    scripttimeout = 1.0
+
+stdlevels = {"error": logging.ERROR, "warn": logging.WARNING, "info": logging.INFO,
+    "debug": logging.DEBUG, "verbose": logging.DEBUG-5}
+logging.addLevelName(stdlevels["verbose"], "VERBOSE")
 
-def log (level, text):
+def log (level, text, *args):
+    """Log text % args at given level.
+    
+    Formatting is deferred until the level is known to be enabled, so pass
+    format arguments separately instead of formatting in the call. Warnings
+    and errors are also shown in a dialog, with or without stdlogging."""
     if level not in FlGlob.loglevels:
         print("[warn] Unknown loglevel: %s" % level)
         level = "warn"
-    if FlGlob.loglevels[level] <= FlGlob.loglevel:
+    if FlGlob.loglevels[level] > FlGlob.loglevel:
+        return
+    if FlGlob.stdlogging:
+        logging.getLogger("flint").log(stdlevels[level], text, *args)
+        if FlGlob.loglevels[level] > FlGlob.loglevels["warn"]:
+            return
+    if args:
+        text = text % args
+    if not FlGlob.stdlogging:
         print("[%s] %s" % (level, text))
-        if level == "warn":
-            QMessageBox.warning(FlGlob.mainwindow, "Warning", text)
-        elif level == "error":
-            QMessageBox.critical(FlGlob.mainwindow, "Error", text)
+    if level == "warn":
+        from PyQt5.QtWidgets import QMessageBox
+        QMessageBox.warning(FlGlob.mainwindow, "Warning", text)
+    elif level == "error":
+        from PyQt5.QtWidgets import QMessageBox
+        QMessageBox.critical(FlGlob.mainwindow, "Error", text)
 
 def elidestring (string, length):
     if len(string) <= length:
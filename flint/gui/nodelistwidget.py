@@ -22,6 +22,7 @@ from PyQt5.QtWidgets import (QAbstractItemView, QAction, QCheckBox,
 from PyQt5.QtGui import QIcon, QPalette
 from flint.glob import FlGlob, elidestring
 from flint.gui.style import FlPalette
+from flint.trace import traced
 from collections import OrderedDict
 
 class SearchWidget (QWidget):
@@ -77,6 +78,7 @@ class SearchWidget (QWidget):
         defbase = palette.color(QPalette.Base)
         deftext = palette.color(QPalette.Text)
         query = self.inputline.text().casefold()
+        self.inputline.setPlaceholderText("Search")
         view = self.parent().view
         if view is not None:
             view.search(query, self.fields)
@@ -157,6 +159,7 @@ class NodeListWidget (QWidget):
         self.populatelist()
     
     @pyqtSlot()
+    @traced()
     def populatelist (self):
         self.index = dict()
         self.nodelist.clear()
@@ -170,8 +173,22 @@ class NodeListWidget (QWidget):
             self.nodelist.addItem(listitem)
             self.index[nodeID] = listitem
         self.remtrashaction.setEnabled(bool(self.view.trash))
+        selected = self.index.get(FlGlob.mainwindow.selectednode, None)
+        if selected is not None:
+            self.nodelist.blockSignals(True)
+            self.nodelist.setCurrentItem(selected)
+            self.nodelist.blockSignals(False)
+            self.onselectionchange()
+    
+    def showreferences (self, nodeID):
+        if not self.active:
+            return
+        self.view.hits = self.view.nodecontainer.referrers(nodeID)
+        self.search.inputline.clear()
+        self.search.inputline.setPlaceholderText("References to node %s" % nodeID)
+        self.populatelist()
     
-    @pyqtSlot(str)
+    @pyqtSlot(int)
     def selectbyID (self, nodeID):
         if not self.active:
             return
@@ -183,7 +200,7 @@ class NodeListWidget (QWidget):
         if   typename == "root":
             descr = ""
         elif typename == "bank":
-            descr = "(%s) %s" % (nodeobj.bankmode, ", ".join(nodeobj.subnodes))
+            descr = "(%s) %s" % (nodeobj.bankmode, ", ".join(str(subID) for subID in nodeobj.subnodes))
         elif typename == "talk":
             descr = "[%s]" % elidestring(nodeobj.text, 30)
         elif typename == "response":
@@ -199,7 +216,7 @@ class NodeListWidget (QWidget):
             trash = False
             icon = QIcon.fromTheme("text-x-generic")
         item = NodeListItem(icon, label)
-        item.setData(item.IDRole, int(nodeID))
+        item.setData(item.IDRole, nodeID)
         item.setData(item.TrashRole, trash)
         return item
     
@@ -209,7 +226,7 @@ class NodeListWidget (QWidget):
             return
         window = FlGlob.mainwindow
         view = window.activeview
-        nodeID = str(listitem.data(listitem.IDRole))
+        nodeID = listitem.data(listitem.IDRole)
         window.setselectednode(view, nodeID)
     
     @pyqtSlot()
@@ -222,7 +239,7 @@ class NodeListWidget (QWidget):
     def activatenode (self, listitem):
         window = FlGlob.mainwindow
         view = window.activeview
-        nodeID = str(listitem.data(listitem.IDRole))
+        nodeID = listitem.data(listitem.IDRole)
         window.setactivenode(view, nodeID)
     
     @pyqtSlot()
@@ -230,17 +247,17 @@ class NodeListWidget (QWidget):
         selected = self.nodelist.selectedItems()
         seltrash = [item for item in selected if item.data(item.TrashRole)]
         answer = QMessageBox.question(self, "Node removal", 
-            "Permanently remove selected trash nodes (%s)?\n\nThis will also clear the undo action list." % len(seltrash))
+            "Remove selected trash nodes (%s)?" % len(seltrash))
         if answer == QMessageBox.No:
             return
-        self.view.removenodes([str(item.data(item.IDRole)) for item in selected])
+        self.view.removenodes([item.data(item.IDRole) for item in seltrash])
         self.remselaction.setEnabled(False)
     
     @pyqtSlot()
     def remtrash (self):
         count = len(self.view.trash)
         answer = QMessageBox.question(self, "Node removal", 
-            "Permanently remove all (%s) trash nodes?\n\nThis will also clear the undo action list." % count)
+            "Remove all (%s) trash nodes?" % count)
         if answer == QMessageBox.No:
             return
         self.remtrashaction.setEnabled(False)
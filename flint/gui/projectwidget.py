@@ -96,7 +96,7 @@ class ProjectWidget (QWidget):
     
     @pyqtSlot(str)
     def updateproject (self, path):
-        log("debug", "updateproject %s" % path)
+        log("debug", "updateproject %s", path)
         count = self.tree.topLevelItemCount()
         item = None
         for i in range(count):
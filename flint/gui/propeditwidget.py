@@ -85,7 +85,7 @@ class PropertiesEditWidget (QWidget):
         textdoc.setDocumentLayout(QPlainTextDocumentLayout(textdoc))
         self.blankdoc = textdoc
     
-    @pyqtSlot(str)
+    @pyqtSlot(int)
     def loadnode (self, nodeID):
         view = FlGlob.mainwindow.activeview
         if view is not None:
@@ -115,8 +115,10 @@ class PropertiesEditWidget (QWidget):
                 convs = [""] + proj.convs
                 # nodeobj.triggerconv will be reset with clear(), so we save it
                 triggerconv = nodeobj.triggerconv
+                self.trigger.blockSignals(True)
                 self.trigger.clear()
                 self.trigger.insertItems(len(convs), convs)
+                self.trigger.blockSignals(False)
                 self.trigger.setCurrentText(triggerconv)
                 self.trigger.setEnabled(True)
             else:
@@ -140,49 +142,45 @@ class PropertiesEditWidget (QWidget):
         if self.nodeobj is None:
             return
         persistence = self.persistence.currentText()
-        self.nodeobj.persistence = persistence
         view = FlGlob.mainwindow.activeview
-        view.callupdates(self.nodeobj.ID, "updatepersistence")
+        view.setfield(self.nodeobj.ID, "persistence", persistence)
     
     @pyqtSlot()
     def bankmodechanged (self):
         if self.nodeobj is None:
             return
         bankmode = self.bankmode.currentText()
-        self.nodeobj.bankmode = bankmode
         view = FlGlob.mainwindow.activeview
-        view.callupdates(self.nodeobj.ID, "updatebankmode")
+        view.setfield(self.nodeobj.ID, "bankmode", bankmode)
     
     @pyqtSlot()
     def questionhubchanged (self):
         if self.nodeobj is None:
             return
         questionhub = self.questionhub.currentText()
-        self.nodeobj.questionhub = questionhub
         view = FlGlob.mainwindow.activeview
-        view.callupdates(self.nodeobj.ID, "updatequestionhub")
+        view.setfield(self.nodeobj.ID, "questionhub", questionhub)
     
     @pyqtSlot()
     def triggerchanged (self):
         if self.nodeobj is None:
             return
         trigger = self.trigger.currentText()
-        self.nodeobj.triggerconv = trigger
         view = FlGlob.mainwindow.activeview
-        view.callupdates(self.nodeobj.ID, "updatetrigger")
+        view.setfield(self.nodeobj.ID, "triggerconv", trigger)
     
     @pyqtSlot()
     def randweightchanged (self):
         if self.nodeobj is None:
             return
         randweight = float(self.randweight.text())
-        self.nodeobj.randweight = randweight
         view = FlGlob.mainwindow.activeview
-        view.callupdates(self.nodeobj.ID, "updaterandweight")
+        view.setfield(self.nodeobj.ID, "randweight", randweight)
     
     @pyqtSlot()
     def commentchanged (self):
         if self.nodeobj is None:
             return
         comment = self.comment.toPlainText()
-        self.nodeobj.comment = comment
+        view = FlGlob.mainwindow.activeview
+        view.setfield(self.nodeobj.ID, "comment", comment)
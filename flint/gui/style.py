@@ -15,8 +15,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from PyQt5.QtCore import QMarginsF
-from PyQt5.QtGui import (QFont, QFontMetrics, QColor)
+from PyQt5.QtCore import Qt, QMarginsF
+from PyQt5.QtGui import (QFont, QFontMetrics, QColor, QGuiApplication, QPixmap)
+import os
 
 class FlPalette (object):
     """Palette of custom colors for quick reference."""
@@ -36,6 +37,34 @@ class FlPalette (object):
     hit     = QColor(120, 255, 180) # search input BG on hit
     miss    = QColor(255, 150, 150) # search input BG on miss
 
+class FlPixmaps (object):
+    """Process-wide cache of icon pixmaps scaled for display.
+    
+    Keyed by (path, size, device pixel ratio), so every image is decoded and
+    scaled only once no matter how many node items display it."""
+    cache = dict()
+    
+    @classmethod
+    def get (cls, path, size):
+        ratio = QGuiApplication.instance().devicePixelRatio()
+        key = (path, size, ratio)
+        if key not in cls.cache:
+            pixmap = QPixmap(path).scaledToWidth(round(size*ratio), Qt.SmoothTransformation)
+            pixmap.setDevicePixelRatio(ratio)
+            cls.cache[key] = pixmap
+        return cls.cache[key]
+    
+    @classmethod
+    def preload (cls, dirpath, size):
+        """Warm the cache with every image in dirpath. Returns False if
+        there is no such directory."""
+        if not os.path.isdir(dirpath):
+            return False
+        for filename in sorted(os.listdir(dirpath)):
+            if filename.endswith(".png"):
+                cls.get(os.path.join(dirpath, filename), size)
+        return True
+
 class FlNodeStyle (object):    
     def __init__ (self, font):
         basefont = font
@@ -15,7 +15,8 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from PyQt5.QtCore import Qt, QRegExp, pyqtSlot
+import weakref
+from PyQt5.QtCore import Qt, QRegExp, QStringListModel, pyqtSlot
 from PyQt5.QtWidgets import (QCompleter, QFormLayout, QLabel, 
 	QLineEdit, QPlainTextDocumentLayout, QPlainTextEdit, QVBoxLayout, 
 	QWidget)
@@ -62,7 +63,7 @@ class TextEditWidget (QWidget):
         self.listener.textChanged.connect(self.setnodelistener)
         self.nodetext.textChanged.connect(self.setnodetext)
         
-    @pyqtSlot(str)
+    @pyqtSlot(int)
     def loadnode (self, nodeID):
         view = FlGlob.mainwindow.activeview
         if view is not None:
@@ -89,23 +90,22 @@ class TextEditWidget (QWidget):
     def setnodespeaker (self):
         if self.nodeobj is None:
             return
-        self.nodeobj.speaker = self.speaker.text()
         view = FlGlob.mainwindow.activeview
-        view.callupdates(self.nodeobj.ID, "updatespeaker")
+        view.setfield(self.nodeobj.ID, "speaker", self.speaker.text())
     
     @pyqtSlot()
     def setnodelistener (self):
         if self.nodeobj is None:
             return
-        self.nodeobj.listener = self.listener.text()
         view = FlGlob.mainwindow.activeview
-        view.callupdates(self.nodeobj.ID, "updatespeaker")
+        view.setfield(self.nodeobj.ID, "listener", self.listener.text())
     
     @pyqtSlot()
     def setnodetext (self):
         if self.nodeobj is None:
             return
-        self.nodeobj.text = self.nodetext.toPlainText()
+        view = FlGlob.mainwindow.activeview
+        view.setfield(self.nodeobj.ID, "text", self.nodetext.toPlainText())
 
 """
 class ScriptParamWidget (QWidget):
@@ -430,7 +430,7 @@ class ConditionEditWidget (CallEditWidget):
         super().__init__(parent)
         self.layout().addWidget(self.callsarea)
     
-    @pyqtSlot(str)
+    @pyqtSlot(int)
     def loadnode (self, nodeID):
         view = FlGlob.mainwindow.activeview
         if view is not None:
@@ -471,7 +471,7 @@ class ScriptEditWidget (CallEditWidget):
         layout.addWidget(newwidget)
         layout.addWidget(self.callsarea)
     
-    @pyqtSlot(str)
+    @pyqtSlot(int)
     def loadnode (self, nodeID):
         view = FlGlob.mainwindow.activeview
         if view is not None:
@@ -641,6 +641,8 @@ class ScriptTextEdit (QPlainTextEdit):
         c.complete(cr)
 
 class ScriptWidget (QWidget):
+    models = dict()
+    
     def __init__ (self, parent, slot):
         super().__init__(parent)
         
@@ -650,22 +652,28 @@ class ScriptWidget (QWidget):
         layout = QVBoxLayout(self)
         
         textedit = ScriptTextEdit(self)
-        #textedit = QPlainTextEdit(self)
-        #completer = QCompleter(self.getscripts().keys(), self)
-        #textedit.setcompleter(completer)
         #self.highlight = ScriptHighlighter(textedit.document())
         #textedit.setPlainText("QWE('rty') and not asd(false)")
         self.textedit = textedit
+        self.blankmodel = QStringListModel(self)
+        textedit.setcompleter(QCompleter(self.blankmodel, self))
+        self.errorlabel = QLabel(self)
+        self.errorlabel.setWordWrap(True)
+        self.nodeobj = None
         
         layout.addWidget(textedit)
+        layout.addWidget(self.errorlabel)
+        textedit.textChanged.connect(self.setnodescript)
     
-    @pyqtSlot(str)
+    @pyqtSlot(int)
     def loadnode (self, nodeID):
         view = FlGlob.mainwindow.activeview
         if view is not None:
             nodeobj = view.nodecontainer.nodes.get(nodeID, None)
         else:
             nodeobj = None
+        self.nodeobj = None
+        self.errorlabel.setText("")
         
         if nodeobj is not None:
             #scriptdoc = view.nodedocs[nodeID].get("script", None)
@@ -673,19 +681,38 @@ class ScriptWidget (QWidget):
             #    view.nodedocs[nodeID][self.slot] = self.scripttodoc(nodeID)
                 
             scriptdoc = view.nodedocs[nodeID][self.slot]
-            completer = QCompleter(self.getscripts().keys(), self)
-            self.textedit.setcompleter(completer)
+            model = self.completermodel(view.nodecontainer.proj)
+            if self.textedit.completer.model() is not model:
+                self.textedit.completer.setModel(model)
             self.textedit.setDocument(scriptdoc)
+            self.nodeobj = nodeobj
             self.setEnabled(True)
         else:
             self.setEnabled(False)
-        
     
-    def getscripts (self, strict=False):
+    @pyqtSlot()
+    def setnodescript (self):
+        if self.nodeobj is None:
+            return
         view = FlGlob.mainwindow.activeview
-        if view is not None and view.nodecontainer.proj is not None:
-            return view.nodecontainer.proj.scripts
-        elif strict:
-            return None
-        else:
-            return dict()
+        try:
+            view.setscript(self.nodeobj.ID, self.slot, self.textedit.toPlainText())
+            self.errorlabel.setText("")
+        except RuntimeError as e:
+            self.errorlabel.setText(str(e))
+    
+    def completermodel (self, proj):
+        """Script names for the completer, shared by every script widget
+        and rebuilt only once the project's scripts have been reloaded."""
+        if proj is None:
+            return self.blankmodel
+        scripts = proj.scripts
+        condition = self.slot == "condition"
+        key = (id(scripts), condition)
+        entry = self.models.get(key, None)
+        if entry is None or entry[0]() is not scripts or entry[1] != scripts.version:
+            catalog = scripts.catalog
+            names = catalog.conditions if condition else catalog.names
+            entry = (weakref.ref(scripts), scripts.version, QStringListModel(names))
+            self.models[key] = entry
+        return entry[2]
@@ -18,8 +18,8 @@
 from PyQt5.QtCore import Qt, QRectF
 from PyQt5.QtWidgets import (QGraphicsItem, QGraphicsItemGroup, 
     QGraphicsRectItem, QMenu)
-from PyQt5.QtGui import (QBrush, QPen, QPixmap)
-from flint.gui.style import FlPalette
+from PyQt5.QtGui import (QBrush, QPen)
+from flint.gui.style import (FlPalette, FlPixmaps)
 from flint.glob import (FlGlob, elidestring)
 from flint.gui.view.conditems import (QGraphicsRectItemCond, 
     QGraphicsSimpleTextItemCond, QGraphicsTextItemCond, 
@@ -33,6 +33,7 @@ class NodeItem(QGraphicsItem):
         self.linkIDs = None
         self.children = None
         self.childpos = None
+        self.docslots = []
         self.nodeobj = nodeobj
         self.style = FlGlob.mainwindow.style
         self.view = weakref.proxy(view)
@@ -87,6 +88,21 @@ class NodeItem(QGraphicsItem):
         self.edge = edge
         edge.setX(self.x())
     
+    def connectdoc (self, doc, slot):
+        signal = doc.contentsChanged
+        signal.connect(slot)
+        self.docslots.append((signal, slot))
+    
+    def detach (self):
+        """Break references to and from this item once it leaves the scene."""
+        for signal, slot in self.docslots:
+            signal.disconnect(slot)
+        self.docslots = []
+        if self.edge is not None:
+            self.edge.source = None
+            self.edge = None
+        self.children = None
+    
     def setactive (self, active):
         if active:
             self.activebox.show()
@@ -161,7 +177,7 @@ class NodeItem(QGraphicsItem):
             self.edge.show()
     
     def issubnode (self):
-        return self.nodeobj.nodebank is not -1
+        return self.nodeobj.nodebank != -1
     
     def isghost (self):
         return not self.state
@@ -283,7 +299,7 @@ class NodeItem(QGraphicsItem):
         pass
     
     def pixmap (self, path):
-        return QPixmap(path).scaledToWidth(self.style.boldheight, Qt.SmoothTransformation)
+        return FlPixmaps.get(path, self.style.boldheight)
     
     def graphicsetup (self):
         lightbrush = QBrush(FlPalette.light)
@@ -330,7 +346,7 @@ class NodeItem(QGraphicsItem):
         self.fggroup.addToGroup(self.nodelabel)
         
         self.icon = self.pixmap("images/blank.png")
-        self.iwidth = self.icon.width()
+        self.iwidth = self.icon.width() // self.icon.devicePixelRatio()
         self.iconx = self.style.nodetextwidth
         
         self.condicon = QGraphicsPixmapItemCond(self.icon, self, viewport)
@@ -366,7 +382,7 @@ class NodeItem(QGraphicsItem):
         
         self.graphgroup.addToGroup(self.fggroup)
         
-        self.view.nodedocs[self.realid()]["comment"].contentsChanged.connect(self.updatecomment)
+        self.connectdoc(self.view.nodedocs[self.realid()]["comment"], self.updatecomment)
         self.updatecondition()
         self.updateenterscripts()
         self.updateexitscripts()
@@ -454,7 +470,7 @@ class NodeItem(QGraphicsItem):
         self.graphgroup.setPos(-activerect.width()//2-activerect.x(), -activerect.height()//2-activerect.y())
         self.prepareGeometryChange()
         self.rect = self.graphgroup.mapRectToParent(mainrect)
-        self.view.updatelayout()
+        self.view.schedulelayout()
     
     def mouseDoubleClickEvent (self, event):
         super().mouseDoubleClickEvent(event)
@@ -516,12 +532,13 @@ class TextNodeItem (NodeItem):
         self.fggroup.addToGroup(self.nodespeaker)
         
         self.nodetext = QGraphicsTextItemCond(self, viewport)
+        self.nodetext.setDocument(self.view.rendertext(self.realid()))
         self.nodetext.setTextWidth(self.style.nodetextwidth)
         self.nodetext.setDefaultTextColor(FlPalette.dark)
         self.nodetext.setPos(0, self.nodespeaker.y()+self.nodespeaker.boundingRect().height()+self.style.itemmargin)
         self.fggroup.addToGroup(self.nodetext)
         
-        self.view.nodedocs[self.realid()]["text"].contentsChanged.connect(self.updatetext)
+        self.connectdoc(self.nodetext.document(), self.updatetext)
     
     def updatespeaker (self):
         speaker = self.nodeobj.speaker
@@ -532,7 +549,6 @@ class TextNodeItem (NodeItem):
     
     def updatetext (self):
         ndtxt = self.nodetext
-        ndtxt.setPlainText(self.view.nodedocs[self.realid()]["text"].toPlainText())
         textrect = ndtxt.mapRectToParent(ndtxt.boundingRect())
         self.textbox.setRect(textrect)
         self.comment.setY(textrect.bottom()+self.style.itemmargin)
@@ -715,7 +731,7 @@ class BankNodeItem (NodeItem):
         self.prepareGeometryChange()
         self.rect = self.graphgroup.mapRectToParent(mainrect)
         if not external:
-            self.view.updatelayout()
+            self.view.schedulelayout()
     
     def setY (self, y):
         super().setY(y)
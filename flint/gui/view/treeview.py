@@ -17,10 +17,11 @@
 
 from PyQt5.QtCore import Qt, QRectF, pyqtSlot
 from PyQt5.QtWidgets import (QGraphicsView, QGraphicsScene)
-from PyQt5.QtGui import QPainter
+from PyQt5.QtGui import QPainter, QTextDocument
 from PyQt5.QtOpenGL import (QGL, QGLFormat, QGLWidget)
 from flint.gui.style import FlPalette
 from flint.glob import (FlGlob, log)
+from flint.trace import traced
 from flint.gui.view.nodeitems import (TalkNodeItem, ResponseNodeItem, 
 	BankNodeItem, RootNodeItem, TriggerNodeItem)
 from flint.gui.view.frameitem import FrameItem
@@ -44,6 +45,13 @@ class TreeView (TreeEditor, QGraphicsView):
         self.playmode = False
         self.itemtable = dict()
         self.itemindex = dict()
+        self.removeditems = []
+        self.textdocs = dict()
+        self.textslots = dict()
+        self.dirtydocs = set()
+        self.constructed = False
+        self.layoutdirty = False
+        self.pendingview = None
         
         self.setOptimizationFlags(QGraphicsView.DontAdjustForAntialiasing | QGraphicsView.DontSavePainterState)
         self.setDragMode(QGraphicsView.ScrollHandDrag)
@@ -66,6 +74,9 @@ class TreeView (TreeEditor, QGraphicsView):
         self.setselectednode(self.treeroot())
     
     def updateview (self, refresh=False):
+        if self.transactiondepth:
+            self.pendingview = refresh or bool(self.pendingview)
+            return
         if refresh:
             for ID in self.nodeorder:
                 self.nodeorder[ID] = None
@@ -76,21 +87,69 @@ class TreeView (TreeEditor, QGraphicsView):
         for child in self.treeroot().childlist():
             child().setrank(self.treeroot())
         self.updatelayout()
-        FlGlob.mainwindow.viewUpdated.emit()
+        FlGlob.mainwindow.scheduleupdate("list")
         
         self.setactivenode(self.activenode)
         self.setselectednode(self.selectednode)
     
+    def commit (self):
+        if self.pendingview is not None:
+            refresh = self.pendingview
+            self.pendingview = None
+            self.updateview(refresh)
+    
+    def updatedocs (self):
+        super().updatedocs()
+        textdocs = {docs["text"] for docs in self.nodedocs.values() if "text" in docs}
+        for source in self.textdocs.keys() - textdocs:
+            self.textdocs.pop(source)
+            source.contentsChanged.disconnect(self.textslots.pop(source))
+            self.dirtydocs.discard(source)
+    
+    def rendertext (self, nodeID):
+        """Document displayed by every item of the node, ghosts included.
+        
+        It follows the node's editable text document, but is only updated
+        once per update flush however many edits were made."""
+        source = self.nodedocs[nodeID]["text"]
+        if source not in self.textdocs:
+            textdoc = QTextDocument(self)
+            textdoc.setPlainText(source.toPlainText())
+            self.textdocs[source] = textdoc
+            self.textslots[source] = source.contentsChanged.connect(lambda: self.textchanged(source))
+        return self.textdocs[source]
+    
+    def textchanged (self, source):
+        self.dirtydocs.add(source)
+        FlGlob.mainwindow.scheduleupdate("layout")
+    
+    def schedulelayout (self):
+        if not self.constructed:
+            return
+        self.layoutdirty = True
+        FlGlob.mainwindow.scheduleupdate("layout")
+    
+    def flushupdates (self):
+        dirtydocs = self.dirtydocs
+        self.dirtydocs = set()
+        for source in dirtydocs:
+            if source in self.textdocs:
+                self.textdocs[source].setPlainText(source.toPlainText())
+        if self.layoutdirty:
+            self.updatelayout()
+    
+    @traced()
     def applychanges (self):
         funcs = {"newitem": self.newitem, "reparent": self.reparent, 
             "removeitem": self.removeitem, "setstate": self.setstate}
         while self.changes:
             change = self.changes.popleft()
             funcs[change[0]](*change[1])
+        self.cleanupitems()
         return True
     
     def newitem (self, fullID, state):
-        log("verbose", "%s.newitem(%s, %s)" % (self, fullID, state))
+        log("verbose", "%s.newitem(%s, %s)", self, fullID, state)
         fromID, toID = fullID
         parent = self.itembyID(fromID)
         nodeobj = self.nodecontainer.nodes[toID]
@@ -114,7 +173,7 @@ class TreeView (TreeEditor, QGraphicsView):
         self.tableitem(fullID, nodeitem)
     
     def reparent (self, oldID, newID):
-        log("verbose", "%s.reparent(%s, %s)" % (self, oldID, newID))
+        log("verbose", "%s.reparent(%s, %s)", self, oldID, newID)
         fromID, toID = newID
         oldref = oldID[0]
         newparent = self.itembyID(fromID)
@@ -124,29 +183,36 @@ class TreeView (TreeEditor, QGraphicsView):
         nodeitem.setrank(newparent)
     
     def removeitem (self, fullID):
-        log("verbose", "%s.removeitem(%s)" % (self, fullID))
+        log("verbose", "%s.removeitem(%s)", self, fullID)
         fromID, toID = fullID
         nodeitem = self.itemtable[fromID].pop(toID)
-        edgeitem = nodeitem.edge
         self.itemindex[toID].remove(nodeitem)
         if not self.itemindex[toID]:
             self.itemindex.pop(toID)
-        scene = self.scene()
-        scene.removeItem(nodeitem)
-        if edgeitem is not None:
-            scene.removeItem(edgeitem)
-            edgeitem.source = None
-            nodeitem.edge = None
         if self.activenode is nodeitem:
             self.activenode = None
         if self.selectednode is nodeitem:
             self.selectednode = None
-        nodeitem = None
-        edgeitem = None
+        self.removeditems.append(nodeitem)
+    
+    def cleanupitems (self):
+        """Drop items removed during the current update from the scene.
+        
+        Reference cycles are broken by hand, so a single collection pass at
+        the end of the batch is enough regardless of the number of items."""
+        if not self.removeditems:
+            return
+        scene = self.scene()
+        for nodeitem in self.removeditems:
+            scene.removeItem(nodeitem)
+            if nodeitem.edge is not None:
+                scene.removeItem(nodeitem.edge)
+            nodeitem.detach()
+        self.removeditems = []
         gc.collect()
     
     def setstate (self, fullID, state):
-        log("verbose", "%s.stestate(%s, %s)" % (self, fullID, state))
+        log("verbose", "%s.stestate(%s, %s)", self, fullID, state)
         fromID, toID = fullID
         nodeitem = self.itemtable[fromID][toID]
         if state == 1:
@@ -176,14 +242,17 @@ class TreeView (TreeEditor, QGraphicsView):
             return None
     
     def treeroot (self):
-        return self.itembyID("0")
+        return self.itembyID(0)
     
+    @traced()
     def updatelayout (self):
         if not self.constructed:
             return
+        self.layoutdirty = False
         root = self.treeroot()
         root.treeposition()
         self.updatescenerect(root)
+        FlGlob.mainwindow.scheduleupdate("minimap")
     
     def updatescenerect (self, root):
         top, bottom, depth = root.subtreesize(-1)
@@ -208,10 +277,10 @@ class TreeView (TreeEditor, QGraphicsView):
     def shownode (self, nodeitem):
         if nodeitem is None:
             return
-        self.ensureVisible(nodeitem, self.style.rankgap/2, self.style.rowgap/2)
+        self.ensureVisible(nodeitem, self.style.rankgap//2, self.style.rowgap//2)
     
     def setselectednode (self, nodeitem):
-        log("verbose", "%s.setselectednode(%s)" % (self, nodeitem))
+        log("verbose", "%s.setselectednode(%s)", self, nodeitem)
         if nodeitem is not None:
             if self.selectednode:
                 self.selectednode.setselected(False)
@@ -219,14 +288,14 @@ class TreeView (TreeEditor, QGraphicsView):
             self.selectednode.setselected(True)
             nodeID = nodeitem.realid()
         else:
-            nodeID = "-1"
+            nodeID = -1
         FlGlob.mainwindow.setselectednode(self, nodeID)
     
-    @pyqtSlot(str)
+    @pyqtSlot(int)
     def selectbyID (self, nodeID):
         if FlGlob.mainwindow.activeview is not self:
             return
-        log("verbose", "%s.selectbyID(%s)" % (self, nodeID))
+        log("verbose", "%s.selectbyID(%s)", self, nodeID)
         if self.playmode:
             return
         if self.selectednode is not None and self.selectednode.realid() == nodeID:
@@ -246,18 +315,18 @@ class TreeView (TreeEditor, QGraphicsView):
                 self.selectednode = None
     
     def setactivenode (self, nodeitem):
-        log("verbose", "%s.setactivenode(%s)" % (self, nodeitem))
+        log("verbose", "%s.setactivenode(%s)", self, nodeitem)
         if nodeitem is not None:
             nodeID = nodeitem.realid()
         else:
-            nodeID = "-1"
+            nodeID = -1
         FlGlob.mainwindow.setactivenode(self, nodeID)
     
-    @pyqtSlot(str)
+    @pyqtSlot(int)
     def activatebyID (self, nodeID):
         if FlGlob.mainwindow.activeview is not self:
             return
-        log("verbose", "%s.activatebyID(%s)" % (self, nodeID))
+        log("verbose", "%s.activatebyID(%s)", self, nodeID)
         if self.playmode:
             return
         if nodeID in self.itemindex:
@@ -284,13 +353,13 @@ class TreeView (TreeEditor, QGraphicsView):
             item.setplaymode(playmode)
             item.setactive(False)
     
-    @pyqtSlot(str)
+    @pyqtSlot(int)
     def playshowID (self, nodeID):
         if nodeID in self.itemindex:
             for nodeitem in self.itemindex[nodeID]:
                 nodeitem.setplaymode(False)
     
-    @pyqtSlot(str)
+    @pyqtSlot(int)
     def playvisitID (self, nodeID):
         if nodeID in self.itemindex:
             for nodeitem in self.itemindex[nodeID]:
@@ -306,13 +375,25 @@ class TreeView (TreeEditor, QGraphicsView):
         newid = super().addnode(nodeID, typename, ndict, undo)
         if not undo:
             self.updateview()
-            self.shownode(self.itembyID(newid))
+            if not self.transactiondepth:
+                self.shownode(self.itembyID(newid))
+        return newid
     
     def addsubnode (self, nodeID, typename="", ndict=None, undo=False):
         newid = super().addsubnode(nodeID, typename, ndict, undo)
         if not undo:
             self.updateview()
-            self.shownode(self.itembyID(newid))
+            if not self.transactiondepth:
+                self.shownode(self.itembyID(newid))
+        return newid
+    
+    def pastesubtree (self, nodeID, refID, source=None, undo=False):
+        newid = super().pastesubtree(nodeID, refID, source, undo)
+        if not undo:
+            self.updateview()
+            if not self.transactiondepth:
+                self.shownode(self.itembyID(newid))
+        return newid
     
     def changebanktype (self, bankID, banktype):
         super().changebanktype(bankID, banktype)
@@ -385,19 +466,42 @@ class TreeView (TreeEditor, QGraphicsView):
         super().collapse(fullID, collapse)
         self.updateview()
     
-    def removenodes (self, nodeIDs):
+    fieldupdates = {
+        "speaker": "updatespeaker",
+        "listener": "updatespeaker",
+        "persistence": "updatepersistence",
+        "bankmode": "updatebankmode",
+        "questionhub": "updatequestionhub",
+        "triggerconv": "updatetrigger",
+        "randweight": "updaterandweight",
+        "condition": "updatecondition",
+        "enterscripts": "updateenterscripts",
+        "exitscripts": "updateexitscripts" }
+    
+    def setfield (self, nodeID, field, value, undo=False):
+        super().setfield(nodeID, field, value, undo)
+        if field in self.fieldupdates:
+            self.callupdates(nodeID, self.fieldupdates[field])
+        if undo:
+            FlGlob.mainwindow.scheduleupdate("docks")
+    
+    def setscript (self, nodeID, field, value, undo=False):
+        super().setscript(nodeID, field, value, undo)
+        self.callupdates(nodeID, self.fieldupdates[field])
+        if undo:
+            FlGlob.mainwindow.scheduleupdate("docks")
+    
+    def removenodes (self, nodeIDs, undo=False):
         copied = FlGlob.mainwindow.copiednode
-        copied.ID = None
-        copied.view = copied.blank
-        super().removenodes(nodeIDs)
-        self.updateview()
-    
-    def removetrash (self):
-        copied = FlGlob.mainwindow.copiednode
-        copied.ID = None
-        copied.view = copied.blank
-        super().removetrash()
-        self.updateview()
+        if copied.ID in nodeIDs:
+            copied.ID = None
+            copied.view = copied.blank
+        if copied.subtreeID in nodeIDs and copied.container() is self.nodecontainer:
+            copied.subtreeID = None
+            copied.container = copied.blank
+        super().removenodes(nodeIDs, undo)
+        if not undo:
+            self.updateview()
     
     def wheelEvent (self, event):
         mod = event.modifiers()
@@ -415,7 +519,7 @@ class TreeView (TreeEditor, QGraphicsView):
         if node is None:
             return
         if key == Qt.Key_Left:
-            if node.refID:
+            if node.refID is not None:
                 self.setselectednode(self.itembyID(node.refID))
         elif key == Qt.Key_Up:
             sib = node.siblingabove()
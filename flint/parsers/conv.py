@@ -15,35 +15,305 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import ast
 import json
+import copy
+import re
 import os.path as path
+from flint.trace import (FlTrace, span, traced)
 
 def scripttotext (script):
+    """Text form of a condition or a list of enter/exit scripts, which
+    parsescript() turns back into an equivalent tree."""
+    def join (call):
+        sep = "; " if call.operatorname == ";" else " %s " % call.operatorname
+        return sep.join(calltotext(c) for c in call.calls)
+    
     def calltotext (call):
-        text = ""
         if call.typename == "script":
-            text += call.funcname
             paramstr = []
             for p in call.funcparams:
                 if isinstance(p, str):
-                    paramstr.append('"%s"' % p)
+                    paramstr.append(json.dumps(p, ensure_ascii=False))
                 else:
                     paramstr.append('%s' % p)
-            text += "(%s)" % ", ".join(paramstr)
-        elif call.typename == "cond":
-            text += "["
-            text += " {op} ".format(op=call.operatorname).join(calltotext(c) for c in call.calls)
-            text += "]"
-        return text
+            text = "%s(%s)" % (call.funcname, ", ".join(paramstr))
+            return "not " + text if call._not else text
+        else:
+            return "[%s]" % join(call)
     
     if isinstance(script, list):
         return "; ".join(calltotext(c) for c in script)
     else:
-        return calltotext(script)
+        return join(script)
 
-def parsescript (script):
-    pass
-    #lines = 
+def nodeid (value):
+    """Node IDs are ints in memory and strings in conversation files; this
+    takes either (or None) and returns the in-memory form."""
+    if value is None:
+        return None
+    return int(value)
+
+def parsescript (text, scripts=None, field="condition"):
+    """Parse script text into a ScriptWrapper, or into a list of ScriptCalls
+    for enter and exit scripts. Raises RuntimeError on syntax errors; script
+    names are not checked here."""
+    tree = ScriptParser.parse(text, field)
+    if field == "condition":
+        return ScriptWrapper(ScriptParser.todict(tree, "cond"), scripts)
+    else:
+        return [ScriptCall(ScriptParser.todict(call), scripts) for call in tree]
+
+class ScriptParser (object):
+    """Recursive descent parser for the script text shown in the editor.
+    
+        condition   := sequence
+        sequence    := alternative (";" alternative)*
+        alternative := conjunction ("or" conjunction)*
+        conjunction := unary ("and" unary)*
+        unary       := ("not" | "!") call | call | "[" sequence "]" | "(" sequence ")"
+        call        := name "(" [value ("," value)*] ")"
+        scripts     := [call (";" call)*]
+    
+    A chain of one operator becomes one wrapper, and brackets always make
+    one. Trees are plain tuples, cached by text: documents are parsed again
+    on every change, and most of those texts have been seen before."""
+    tokenpattern = re.compile(r"""\s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*') |
+        (?P<number>[+-]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?) |
+        (?P<name>[A-Za-z_]\w*) |
+        (?P<punct>[()\[\],;!]) |
+        (?P<error>\S))""", re.VERBOSE)
+    operators = (";", "or", "and")
+    cachesize = 1 << 14
+    cache = dict()
+    
+    def __init__ (self, text):
+        self.text = text
+        self.tokens = []
+        for match in self.tokenpattern.finditer(text):
+            kind = match.lastgroup
+            value = match.group(kind)
+            pos = match.start(kind)
+            if kind == "error":
+                self.error("unexpected %r" % value, pos)
+            elif kind == "name" and value.lower() in ("and", "or", "not"):
+                kind, value = "punct", value.lower()
+            self.tokens.append((kind, value, pos))
+        self.tokens.append(("end", None, len(text)))
+        self.index = 0
+    
+    @classmethod
+    def parse (cls, text, field="condition"):
+        key = (field == "condition", text)
+        tree = cls.cache.get(key)
+        if tree is None:
+            parser = cls(text)
+            if field == "condition":
+                tree = parser.condition()
+            else:
+                tree = parser.scripts()
+            if len(cls.cache) >= cls.cachesize:
+                cls.cache.clear()
+            cls.cache[key] = tree
+        return tree
+    
+    @classmethod
+    def todict (cls, tree, typename="wrap"):
+        if tree[0] == "script":
+            sc_dict = {"type": "script", "command": tree[1], "params": list(tree[2])}
+            if tree[3]:
+                sc_dict["not"] = True
+            return sc_dict
+        return {"type": typename, "operator": tree[1], 
+            "calls": [cls.todict(c) for c in tree[2]]}
+    
+    def error (self, message, pos):
+        raise RuntimeError("Script syntax error at %s: %s" % (pos+1, message))
+    
+    def peek (self):
+        return self.tokens[self.index]
+    
+    def accept (self, value):
+        kind, tokvalue, pos = self.tokens[self.index]
+        if kind == "punct" and tokvalue == value:
+            self.index += 1
+            return True
+        return False
+    
+    def expect (self, value):
+        if not self.accept(value):
+            kind, tokvalue, pos = self.peek()
+            found = "end of script" if kind == "end" else repr(tokvalue)
+            self.error("expected %r, found %s" % (value, found), pos)
+    
+    def end (self):
+        kind, value, pos = self.peek()
+        if kind != "end":
+            self.error("unexpected %r" % value, pos)
+    
+    def condition (self):
+        if self.peek()[0] == "end":
+            return ("wrap", "and", (), False)
+        tree = self.expression()
+        self.end()
+        if tree[0] == "script" or tree[3]:
+            return ("wrap", "and", (tree,), False)
+        return tree
+    
+    def scripts (self):
+        calls = []
+        while self.peek()[0] != "end":
+            calls.append(self.call())
+            if not self.accept(";"):
+                break
+        self.end()
+        return tuple(calls)
+    
+    def expression (self, level=0):
+        if level == len(self.operators):
+            return self.unary()
+        op = self.operators[level]
+        items = [self.expression(level+1)]
+        while self.accept(op):
+            items.append(self.expression(level+1))
+        if len(items) == 1:
+            return items[0]
+        return ("wrap", op, tuple(items), False)
+    
+    def unary (self):
+        if self.accept("not") or self.accept("!"):
+            if self.peek()[0] != "name":
+                self.error("'not' only applies to script calls", self.peek()[2])
+            kind, name, params, negate = self.call()
+            return (kind, name, params, not negate)
+        for opening, closing in (("[", "]"), ("(", ")")):
+            if self.accept(opening):
+                if self.accept(closing):
+                    return ("wrap", "and", (), True)
+                tree = self.expression()
+                self.expect(closing)
+                if tree[0] == "script" or tree[3]:
+                    return ("wrap", "and", (tree,), True)
+                return tree[:3] + (True,)
+        return self.call()
+    
+    def call (self):
+        kind, name, pos = self.peek()
+        if kind != "name":
+            found = "end of script" if kind == "end" else repr(name)
+            self.error("expected a script call, found %s" % found, pos)
+        self.index += 1
+        self.expect("(")
+        params = []
+        if not self.accept(")"):
+            params.append(self.value())
+            while self.accept(","):
+                params.append(self.value())
+            self.expect(")")
+        return ("script", name, tuple(params), False)
+    
+    def value (self):
+        kind, value, pos = self.peek()
+        self.index += 1
+        if kind == "string":
+            return ast.literal_eval(value)
+        elif kind == "number":
+            if value.lstrip("+-").isdigit():
+                return int(value)
+            return float(value)
+        elif kind == "name" and value.lower() in ("true", "false"):
+            return value.lower() == "true"
+        found = "end of script" if kind == "end" else repr(value)
+        self.error("expected a value, found %s" % found, pos)
+
+class ScriptCompiler (object):
+    """Turns script calls and condition trees into generated functions.
+    
+    Script functions and their parameters are bound as closure cells rather
+    than spelled out in the source, so the source depends only on the shape
+    of the tree and its code object is shared by every call of that shape.
+    Conditions nested deeper than inlinedepth get a function of their own,
+    which keeps the generated expressions within the parser's limits."""
+    inlinedepth = 32
+    cachesize = 1024
+    codecache = dict()
+    
+    def __init__ (self):
+        self.names = []
+        self.values = []
+    
+    def bind (self, value):
+        name = "b%d" % len(self.names)
+        self.names.append(name)
+        self.values.append(value)
+        return name
+    
+    def callexpr (self, call):
+        if call.funccall is None:
+            return "None"
+        args = ", ".join(self.bind(p) for p in call.funcparams)
+        expr = "%s(%s)" % (self.bind(call.funccall), args)
+        if call._not:
+            return "(not %s)" % expr
+        return expr
+    
+    def valueexpr (self, call, depth=0):
+        """Expression for the value call.run() (or call.run()[0] for a
+        wrapper) returns. and/or keep Python's short-circuit semantics,
+        which the interpreted loop mirrors, and ";" evaluates everything."""
+        if call.typename == "script":
+            return self.callexpr(call)
+        elif not call.calls:
+            return "True"
+        elif depth >= self.inlinedepth:
+            return "%s()" % self.bind(ScriptCompiler().value(call))
+        parts = [self.valueexpr(c, depth+1) for c in call.calls]
+        if call.operator is None:
+            return "(%s,)[-1]" % ", ".join(parts)
+        op = " and " if call.operator else " or "
+        return "(%s)" % op.join(parts)
+    
+    def build (self, lines):
+        source = "def make (%s):\n    def compiled ():\n%s\n    return compiled\n" % (
+            ", ".join(self.names), "\n".join("        %s" % l for l in lines))
+        code = self.codecache.get(source)
+        if code is None:
+            if len(self.codecache) >= self.cachesize:
+                self.codecache.clear()
+            code = compile(source, "<script>", "exec")
+            self.codecache[source] = code
+        namespace = dict()
+        exec(code, namespace)
+        return namespace["make"](*self.values)
+    
+    def call (self, call):
+        return self.build(["return %s" % self.callexpr(call)])
+    
+    def calllist (self, calls):
+        lines = [self.callexpr(c) for c in calls if c.funccall is not None]
+        return self.build(lines or ["pass"])
+    
+    def value (self, wrapper):
+        return self.build(["return %s" % self.valueexpr(wrapper)])
+    
+    def wrapper (self, wrapper):
+        """Function returning what wrapper.run() does: the deciding value
+        and the signature of the script call that produced it."""
+        if not wrapper.calls:
+            return self.build(["return (True, None)"])
+        lines = []
+        for i, call in enumerate(wrapper.calls):
+            if call.typename == "script":
+                callsig = self.bind((call.funcname, (*call.funcparams,)))
+            else:
+                callsig = "None"
+            lines.append("v = %s" % self.valueexpr(call, 1))
+            if wrapper.operator is not None and i < len(wrapper.calls)-1:
+                test = "not v" if wrapper.operator else "v"
+                lines.append("if %s: return (v, %s)" % (test, callsig))
+        lines.append("return (v, %s)" % callsig)
+        return self.build(lines)
 
 class ScriptCall (object):
     def __init__ (self, sc_dict, scripts=None):
@@ -51,22 +321,43 @@ class ScriptCall (object):
         self.funcname = sc_dict['command']
         self.funcparams = sc_dict.get('params', [])
         self._not = sc_dict.get('not', False)
-        if scripts is None:
-            self.funccall = None
-            return
+        self.setscripts(scripts)
+    
+    def setscripts (self, scripts):
         self.scripts = scripts
-        if self.funcname not in self.scripts:
-            raise RuntimeError("Unknown script: %s" % self.funcname)
-        self.funccall = self.scripts[self.funcname]
+        self.version = -1
+        self.resolved = None
+    
+    @property
+    def funccall (self):
+        """The script function, looked up by name again whenever the
+        registry has been reloaded since the last lookup. None if the call
+        is not bound to a registry."""
+        scripts = self.scripts
+        if scripts is None:
+            return None
+        if self.version != scripts.version:
+            self.resolved = scripts.resolve(self.funcname)
+            self.version = scripts.version
+        return self.resolved
     
     def run (self):
-        if self.funccall is None:
+        if self.scripts is None:
             return None
+        if FlTrace.enabled:
+            with span(self.funcname, cat="script"):
+                return self.call()
+        return self.call()
+    
+    def call (self):
         if self._not:
             return not self.funccall(*self.funcparams)
         else:
             return self.funccall(*self.funcparams)
     
+    def compile (self):
+        return ScriptCompiler().call(self)
+    
     def todict (self):
         sc_dict = {"type": self.typename, "command": self.funcname}
         if len(self.funcparams) > 0:
@@ -76,18 +367,57 @@ class ScriptCall (object):
         return sc_dict
 
 class ScriptWrapper (object):
+    compileafter = 8
+    
     def __init__ (self, cond_dict, scripts=None):
         self.types = {"script":ScriptCall, "wrap":ScriptWrapper}
         self.operators = {"and":True, "or":False, ";":None}
         self.typename = cond_dict['type']
+        self.scripts = scripts
         self.operatorname = cond_dict['operator']
         self.operator = self.operators[self.operatorname]
         self.calls = []
         for call in cond_dict['calls']:
             typename = self.types[ call['type'] ]
             self.calls.append( typename(call, scripts) )
+        self.compiled = None
+        self.compiledversion = None
+        self.runs = 0
+    
+    def setscripts (self, scripts):
+        self.scripts = scripts
+        for call in self.calls:
+            call.setscripts(scripts)
+        self.invalidate()
     
     def run (self):
+        """Evaluate the condition. It is interpreted for the first few runs
+        and compiled once it has proven hot, as compiling costs as much as a
+        dozen interpreted runs. While tracing, calls are always interpreted
+        so that every script gets its own span."""
+        if FlTrace.enabled:
+            return self.interpret()
+        if self.compiled is None:
+            self.runs += 1
+            if self.runs <= self.compileafter:
+                return self.interpret()
+            self.compiled = self.compile()
+        elif self.scripts is not None and self.scripts.version != self.compiledversion:
+            self.compiled = self.compile() # scripts were reloaded
+        return self.compiled()
+    
+    def compile (self):
+        if self.scripts is not None:
+            self.compiledversion = self.scripts.version
+        return ScriptCompiler().wrapper(self)
+    
+    def invalidate (self):
+        """Drop the compiled function. Needed after changing calls or their
+        parameters in place; call it on the outermost wrapper."""
+        self.compiled = None
+        self.runs = 0
+    
+    def interpret (self):
         if not self.calls:
             return (True, None)
         for call in self.calls:
@@ -96,14 +426,30 @@ class ScriptWrapper (object):
                 value = call.run()
             else:
                 callsig = None
-                value = call.run()[0]
+                value = call.interpret()[0]
             if self.operator is not None and bool(value) != self.operator:
                 return (value, callsig)
         return (value, callsig)
     
+    def scriptnames (self):
+        for call in self.calls:
+            if call.typename == "script":
+                yield call.funcname
+            else:
+                yield from call.scriptnames()
+    
+    def callsigs (self):
+        """(name, params) of every script call in the tree."""
+        for call in self.calls:
+            if call.typename == "script":
+                yield (call.funcname, tuple(call.funcparams))
+            else:
+                yield from call.callsigs()
+    
     def setoperator (self, operatorname):
         self.operatorname = operatorname
         self.operator = self.operators[operatorname]
+        self.invalidate()
     
     def todict (self):
         return {"type": self.typename, "operator": self.operatorname, 
@@ -117,43 +463,74 @@ class ChartNode (object):
         else:
             scripts = None
         self.typename = node_dict['type']
-        self.ID = str(nodeID)
+        self.ID = nodeid(nodeID)
         self.linkIDs = []
         
         for link in node_dict.get('links', []):
-            self.addlink(str(link))
+            self.addlink(nodeid(link))
         
         self.condition = ScriptWrapper(node_dict.get('condition', self.container.defaultcond), scripts)
         
         self.enterscripts = [ScriptCall(s, scripts) for s in node_dict.get('enterscripts', [])]
         self.exitscripts  = [ScriptCall(s, scripts) for s in node_dict.get('exitscripts',  [])]
+        self.compiledscripts = dict()
         
         self.randweight  = node_dict.get("randweight",        0)
-        self.nodebank    = node_dict.get("nodebank",         -1)
+        self.nodebank    = nodeid(node_dict.get("nodebank",  -1))
         self.text        = node_dict.get("text",             "")
         self.speaker     = node_dict.get("speaker",          "")
         self.listener    = node_dict.get("listener",         "")
         self.optvars     = node_dict.get("vars",         dict())
         self.comment     = node_dict.get("comment",          "")
         self.persistence = node_dict.get("persistence",      "")
-        self.subnodes    = node_dict.get("subnodes",         [])
+        self.subnodes    = [nodeid(subID) for subID in node_dict.get("subnodes", [])]
         self.banktype    = node_dict.get("banktype",         "")
         self.bankmode    = node_dict.get("bankmode",         "")
         self.questionhub = node_dict.get("questionhub",      "")
         self.triggerconv = node_dict.get("triggerconv",      "")
     
     def reinitscripts (self):
+        """Bind the node's scripts to the registry of the container's
+        current project. Reloading a project's scripts does not need this."""
         if self.container.proj:
             scripts = self.container.proj.scripts
         else:
             scripts = None
-        self.enterscripts = [ScriptCall(s.todict(), scripts) for s in self.enterscripts]
-        self.exitcripts   = [ScriptCall(s.todict(), scripts) for s in self.exitscripts]
-        self.condition = ScriptWrapper(self.condition.todict(), scripts)
+        for call in self.enterscripts + self.exitscripts:
+            call.setscripts(scripts)
+        self.condition.setscripts(scripts)
+        self.compiledscripts.clear()
+    
+    def scriptnames (self):
+        for call in self.enterscripts + self.exitscripts:
+            yield call.funcname
+        yield from self.condition.scriptnames()
+    
+    def invalidatescripts (self):
+        """Drop compiled scripts after editing them in place."""
+        self.compiledscripts.clear()
+        self.condition.invalidate()
     
     def checkcond (self):
         return self.condition.run()
     
+    def runscripts (self, slot):
+        """Run enter or exit scripts in order, as one compiled function."""
+        scripts = self.enterscripts if slot == "enter" else self.exitscripts
+        if not scripts:
+            return
+        elif FlTrace.enabled:
+            for script in scripts:
+                script.run()
+            return
+        registry = scripts[0].scripts
+        version = registry.version if registry is not None else None
+        compiled = self.compiledscripts.get(slot)
+        if compiled is None or compiled[1] != version:
+            compiled = (ScriptCompiler().calllist(scripts), version)
+            self.compiledscripts[slot] = compiled
+        compiled[0]()
+    
     def checkchildren (self):
         pass
     
@@ -166,6 +543,8 @@ class ChartNode (object):
                 self.linkIDs.append(nodeID)
             else:
                 self.linkIDs.insert(pos, nodeID)
+            if self.container.nodes.get(self.ID) is self:
+                self.container.reindex(self.ID)
     
     def hascond (self):
         return self.condition.todict() != self.container.defaultcondcall.todict()
@@ -177,12 +556,12 @@ class ChartNode (object):
         return len(self.exitscripts) > 0
     
     def copy (self):
-        return self.container.types[self.typename](self.container, self.todict(), "")
+        return self.container.types[self.typename](self.container, self.todict(), None)
     
     def todict (self):
         node_dict = { "type": self.typename }
         if self.linkIDs:
-            node_dict["links"]        = self.linkIDs
+            node_dict["links"]        = [str(linkID) for linkID in self.linkIDs]
         if self.hascond():
             node_dict['condition']    = self.condition.todict()
         if self.enterscripts:
@@ -194,7 +573,7 @@ class ChartNode (object):
         if self.comment:
             node_dict['comment']      = self.comment
         if self.nodebank != -1:
-            node_dict['nodebank']     = self.nodebank
+            node_dict['nodebank']     = str(self.nodebank)
         if self.persistence:
             node_dict['persistence']  = self.persistence
         if self.randweight:
@@ -247,7 +626,7 @@ class BankNode (ChartNode):
     def todict (self):
         node_dict = super().todict()
         if self.subnodes:
-            node_dict["subnodes"] = self.subnodes
+            node_dict["subnodes"] = [str(subID) for subID in self.subnodes]
         if self.bankmode and self.bankmode != "First":
             node_dict["bankmode"] = self.bankmode
         if self.banktype:
@@ -271,11 +650,13 @@ class NodesContainer (object):
         self.projfile = nodes_dict.get("project", "")
         self.proj = proj
         self.name = nodes_dict['name']
-        self.nextID = str(nodes_dict['nextID'])
+        self.nextID = int(nodes_dict['nextID'])
         self.nodes = dict()
+        self.parents = dict()
+        self.children = dict()
         for nodeID, nodedict in nodes_dict['nodes'].items():
-            nodeID = str(nodeID)
-            self.newnode(nodedict, nodeID)
+            self.newnode(nodedict, nodeid(nodeID))
+        self.validatescripts()
         self.defaulttemplates = {
             "bank":    {"type": "bank"},
             "talk":    {"type": "talk"},
@@ -288,23 +669,119 @@ class NodesContainer (object):
     def reinitscripts (self):
         for node in self.nodes.values():
             node.reinitscripts()
+        self.validatescripts()
     
-    def newnode (self, node_dict, newID=False, refID=False, bankID=False, force=False):
-        if not newID:
+    def validatescripts (self):
+        """Raise RuntimeError naming every script the nodes call that the
+        project does not define. Calls are resolved lazily, so this is the
+        only place a conversation is checked as a whole."""
+        if self.proj is None:
+            return
+        names = set()
+        for node in self.nodes.values():
+            names.update(node.scriptnames())
+        self.proj.scripts.validate(names)
+    
+    def newnode (self, node_dict, newID=None, refID=None, bankID=None, force=False):
+        if newID is None:
             newID = self.nextID
-            self.nextID = str(int(self.nextID) + 1)
+            self.nextID += 1
         node = self.types[node_dict['type']](self, node_dict, newID)
         if newID in self.nodes and not force:
             raise RuntimeError("Duplicate ID in nodes list")
         self.nodes[newID] = node
-        if refID:
+        self.reindex(newID)
+        if refID is not None:
             self.nodes[refID].addlink(newID)
-        elif bankID:
+        elif bankID is not None:
             self.nodes[bankID].subnodes.append(newID)
+            self.reindex(bankID)
         return node
     
+    def reindex (self, *nodeIDs):
+        """Bring the parents index up to date with the current links and
+        subnodes of nodeIDs. Needs calling after their lists are changed
+        directly, and after a node is removed from or put back into nodes."""
+        for nodeID in nodeIDs:
+            nodeobj = self.nodes.get(nodeID, None)
+            if nodeobj is None:
+                new = frozenset()
+            else:
+                new = frozenset(nodeobj.linkIDs + nodeobj.subnodes)
+            old = self.children.get(nodeID, frozenset())
+            for childID in old - new:
+                self.parents[childID].discard(nodeID)
+            for childID in new - old:
+                self.parents.setdefault(childID, set()).add(nodeID)
+            if new:
+                self.children[nodeID] = new
+            else:
+                self.children.pop(nodeID, None)
+    
+    def referrers (self, nodeID):
+        """IDs of the nodes that link to nodeID or hold it as a subnode."""
+        return set(self.parents.get(nodeID, ()))
+    
+    def reachable (self, startID, stopID=None):
+        """IDs reachable from startID through links and subnodes, in
+        breadth-first order. Nodes past stopID are not followed."""
+        order = [startID]
+        seen = {startID}
+        for nodeID in order:
+            if nodeID == stopID:
+                continue
+            nodeobj = self.nodes[nodeID]
+            for childID in nodeobj.linkIDs + nodeobj.subnodes:
+                if childID not in seen and childID in self.nodes:
+                    seen.add(childID)
+                    order.append(childID)
+        return order
+    
+    def clonesubtree (self, nodeID, source=None):
+        """Copy the subtree of nodeID from source (by default this container)
+        under freshly allocated IDs. Returns the mapping of old to new IDs.
+        
+        The subtree holds the nodes that can only be reached through nodeID.
+        Links from it to other nodes are kept when copying within the same
+        container and dropped otherwise. The copy of nodeID is not linked
+        anywhere. Raises RuntimeError, before anything is added, if the copy
+        calls scripts the project does not define."""
+        if source is None:
+            source = self
+        outside = set(source.reachable(0, stopID=nodeID))
+        outside.discard(nodeID)
+        order = [ID for ID in source.reachable(nodeID) if ID not in outside]
+        start = self.nextID
+        idmap = {oldID: start+i for i, oldID in enumerate(order)}
+        newIDs = set(idmap.values())
+        
+        newnodes = dict()
+        for oldID in order:
+            oldobj = source.nodes[oldID]
+            nodedict = copy.deepcopy(oldobj.todict())
+            links = [idmap.get(linkID, linkID) for linkID in oldobj.linkIDs]
+            if source is not self:
+                links = [linkID for linkID in links if linkID in newIDs]
+            nodedict["links"] = links
+            nodedict["subnodes"] = [idmap[subID] for subID in oldobj.subnodes if subID in idmap]
+            if oldID == nodeID:
+                nodedict["nodebank"] = -1
+            else:
+                nodedict["nodebank"] = idmap.get(oldobj.nodebank, -1)
+            newID = idmap[oldID]
+            newnodes[newID] = self.types[nodedict['type']](self, nodedict, newID)
+        if self.proj is not None:
+            names = set()
+            for nodeobj in newnodes.values():
+                names.update(nodeobj.scriptnames())
+            self.proj.scripts.validate(names)
+        self.nodes.update(newnodes)
+        self.reindex(*newnodes)
+        self.nextID = start + len(order)
+        return idmap
+    
     def newlink (self, fromID, toID, pos=None):
-        if fromID != toID and toID in self.nodes and toID != "0" and \
+        if fromID != toID and toID in self.nodes and toID != 0 and \
            fromID in self.nodes:
             self.nodes[fromID].addlink(toID, pos=pos)
     
@@ -314,7 +791,8 @@ class NodesContainer (object):
         writejson(self, self.filename)
     
     def todict (self):
-        nodes_dict = {"name":self.name, "nextID":self.nextID, "nodes":self.nodes}
+        nodes_dict = {"name":self.name, "nextID":str(self.nextID), 
+            "nodes": {str(nodeID): nodeobj for nodeID, nodeobj in self.nodes.items()}}
         if self.templates and self.templates is not self.defaulttemplates:
             nodes_dict["templates"] = dict()
             for typename, template in self.templates.items():
@@ -325,6 +803,7 @@ class NodesContainer (object):
             nodes_dict["project"] = projfile
         return nodes_dict
 
+@traced("conv.loadjson")
 def loadjson (filename, proj=None):
     with open(filename, 'r') as f:
         return NodesContainer(json.load(f), filename, proj=proj)
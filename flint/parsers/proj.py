@@ -19,7 +19,10 @@ import json
 import os.path as path
 import sys
 import importlib
+import inspect
+from collections.abc import Mapping
 from warnings import warn
+from flint.scriptpool import ScriptPool
 
 class NodePropertyValue (object):
     def __init__ (self, valname, valbody):
@@ -64,14 +67,108 @@ class NodeProperty (object):
     def __lt__ (self, other):
         return self.name < other.name
 
+class ScriptInfo (object):
+    """Signature of a script function, as the editor presents it. params
+    holds (name, annotation, default) tuples, with None for a missing
+    annotation or default."""
+    def __init__ (self, name, func):
+        self.name = name
+        self.params = []
+        self.returns = None
+        self.condition = "return" in getattr(func, "__annotations__", {})
+        try:
+            signature = inspect.signature(func)
+        except (TypeError, ValueError):
+            return
+        for param in signature.parameters.values():
+            if param.name == "self":
+                continue
+            annot = param.annotation if param.annotation is not param.empty else None
+            default = param.default if param.default is not param.empty else None
+            self.params.append((param.name, annot, default))
+        if signature.return_annotation is not signature.empty:
+            self.returns = signature.return_annotation
+
+class ScriptCatalog (object):
+    """Names and signatures of every script in a registry, worked out once
+    per (re)load. conditions lists the scripts usable in conditions, which
+    are those with a return annotation."""
+    def __init__ (self, scripts):
+        self.infos = {name: ScriptInfo(name, func) for name, func in scripts.items()}
+        self.names = sorted(self.infos)
+        self.conditions = [name for name in self.names if self.infos[name].condition]
+    
+    def get (self, name):
+        return self.infos.get(name, None)
+
+class ScriptRegistry (Mapping):
+    """Script functions of a project by name.
+    
+    Script calls keep a reference to the registry rather than to the
+    functions, and look them up again once version has changed. Reloading
+    the script module is therefore a single swap, however many nodes call
+    into it."""
+    def __init__ (self, scripts=None):
+        self.table = scripts if scripts is not None else dict()
+        self.version = 0
+        self.catalog = ScriptCatalog(self.table)
+    
+    def swap (self, scripts):
+        self.table = scripts
+        self.version += 1
+        self.catalog = ScriptCatalog(self.table)
+    
+    def resolve (self, name):
+        func = self.table.get(name, None)
+        if func is None:
+            raise RuntimeError("Unknown script: %s" % name)
+        return func
+    
+    def unknown (self, names):
+        return sorted(name for name in set(names) if name not in self.table)
+    
+    def validate (self, names):
+        unknown = self.unknown(names)
+        if unknown:
+            raise RuntimeError("Unknown script%s: %s" % ("s" if len(unknown) > 1 else "", 
+                ", ".join(unknown)))
+    
+    def __getitem__ (self, name):
+        return self.table[name]
+    
+    def __iter__ (self):
+        return iter(self.table)
+    
+    def __len__ (self):
+        return len(self.table)
+
+def importscripts (abspath, reinit=False):
+    """Import the script module at abspath and return its ScriptCalls."""
+    modname, ext = path.splitext(path.basename(abspath))
+    scriptdir = path.dirname(abspath)
+    sys.path.append(scriptdir)
+    scriptmod = importlib.import_module(modname)
+    if reinit:
+        scriptmod = importlib.reload(scriptmod)
+    scripts = scriptmod.ScriptCalls
+    if not isinstance(scripts, dict):
+        raise RuntimeError("ScriptCalls is not a dict: %s" % abspath)
+    return scripts
+
 class FlintProject (object):
-    def __init__ (self, projdict, filename=""):
+    def __init__ (self, projdict, filename="", scriptworkers=0, scripttimeout=1.0):
+        """With scriptworkers, scripts run in that many worker processes
+        instead of being imported, and calls time out after scripttimeout
+        seconds."""
         self.filename = path.abspath(filename)
         self.name = projdict.get("name", "")
         self.path = path.dirname(self.filename)
         self.properties = self.initproperties(projdict.get("properties", {}))
         self.scriptfile = projdict.get("scripts", "")
-        self.scripts = self.initscripts(self.scriptfile)
+        self.scriptworkers = scriptworkers
+        self.scripttimeout = scripttimeout
+        self.scriptpool = None
+        self.scripts = ScriptRegistry(self.initscripts(self.scriptfile))
         self.convs = self.initconvs(projdict.get("convs", []))
         self.tempconvs = []
     
@@ -85,23 +182,25 @@ class FlintProject (object):
         if relpath:
             abspath = path.join(self.path, relpath)
             if path.exists(abspath):
-                modname, ext = path.splitext(path.basename(abspath))
-                scriptdir = path.dirname(abspath)
-                sys.path.append(scriptdir)
-                scriptmod = importlib.import_module(modname)
-                if reinit:
-                    scriptmod = importlib.reload(scriptmod)
-                scripts = scriptmod.ScriptCalls
-                if not isinstance(scripts, dict):
-                    raise RuntimeError("ScriptCalls is not a dict: %s" % relpath)
-                return scripts
+                if self.scriptworkers:
+                    return self.initpool(abspath)
+                return importscripts(abspath, reinit)
             else:
                 raise RuntimeError("Invalid script path: %s" % relpath)
         else:
             return dict()
     
+    def initpool (self, abspath):
+        if self.scriptpool is not None and self.scriptpool.scriptpath == abspath:
+            self.scriptpool.restart()
+        else:
+            if self.scriptpool is not None:
+                self.scriptpool.close()
+            self.scriptpool = ScriptPool(abspath, self.scriptworkers, self.scripttimeout)
+        return self.scriptpool.proxies()
+    
     def reloadscripts (self):
-        self.scripts = self.initscripts(self.scriptfile, reinit=True)
+        self.scripts.swap(self.initscripts(self.scriptfile, reinit=True))
     
     def initconvs (self, convs_list):
         paths = []
@@ -141,9 +240,9 @@ class FlintProject (object):
     def todict (self):
         return {"scripts": self.scriptfile, "convs": self.convs, "name": self.name}
 
-def loadjson (filename):
+def loadjson (filename, **options):
     with open(filename, 'r') as f:
-        return FlintProject(json.load(f), filename)
+        return FlintProject(json.load(f), filename, **options)
 
 def writejson (proj, filename):
     with open(filename, 'w') as f:
@@ -157,7 +256,8 @@ def newproject (filename, save=True, scripts=True):
     if scripts:
         scriptpath = path.join(proj.path, "scripts.py")
         newscriptfile(scriptpath)
-        proj.scripts = proj.initscripts(proj.relpath(scriptpath))
+        proj.scriptfile = proj.relpath(scriptpath)
+        proj.scripts.swap(proj.initscripts(proj.scriptfile))
     if save or scripts:
         proj.savetofile()
     return proj
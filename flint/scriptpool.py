@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Out-of-process execution of project scripts.
+
+A ScriptPool starts worker processes that import the project's script
+module, so a slow or hanging script cannot freeze the editor or the
+player. The pool hands out proxies that stand in for the script functions
+in a ScriptRegistry, so conditions and script lists run unchanged, one IPC
+round trip per call. ConvPlayer batches the condition calls of a step into
+a single round trip with batch().
+
+Workers are plain interpreters running this module, talking over a
+multiprocessing connection, which keeps them clear of whatever the
+parent's __main__ does on import. Calls that run past the timeout are
+interrupted in the worker where the platform allows; a worker that stops
+answering altogether is killed and replaced."""
+
+import atexit
+import inspect
+import os
+import pickle
+import signal
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from multiprocessing.connection import Client, Listener
+from flint.trace import Histogram
+
+class ScriptTimeout (BaseException):
+    """Raised in a worker when a call runs out of time. Not an Exception,
+    so that scripts catching Exception cannot swallow it."""
+    pass
+
+class ScriptProxy (object):
+    """Callable standing in for a script function that lives in the pool.
+    Carries the function's signature, so the script catalog sees no
+    difference."""
+    def __init__ (self, pool, name, info):
+        self.pool = pool
+        self.__name__ = name
+        params, returns, hasreturn = info
+        parameters = []
+        for pname, annot, default in params:
+            parameters.append(inspect.Parameter(pname, inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                annotation=annot if annot is not None else inspect.Parameter.empty,
+                default=default if default is not None else inspect.Parameter.empty))
+        self.__annotations__ = {pname: annot for pname, annot, default in params if annot is not None}
+        if hasreturn:
+            self.__annotations__["return"] = returns
+        try:
+            self.__signature__ = inspect.Signature(parameters, return_annotation=
+                returns if hasreturn else inspect.Signature.empty)
+        except ValueError: # defaults out of order
+            self.__signature__ = inspect.Signature(
+                [p.replace(default=p.empty) for p in parameters])
+    
+    def __call__ (self, *params):
+        return self.pool.call(self.__name__, params)
+    
+    def __repr__ (self):
+        return "<%s %s>" % (type(self).__name__, self.__name__)
+
+class ScriptWorker (object):
+    """Parent side of one worker process."""
+    def __init__ (self, scriptpath, timeout):
+        authkey = os.urandom(16)
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(p for p in (root, env.get("PYTHONPATH")) if p)
+        self.proc = subprocess.Popen([sys.executable, "-m", "flint.scriptpool", scriptpath, 
+            str(timeout)], stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env)
+        self.proc.stdin.write(authkey.hex().encode() + b"\n")
+        self.proc.stdin.close()
+        address = self.proc.stdout.readline().decode().strip()
+        if not address:
+            self.proc.wait()
+            raise RuntimeError("Script worker failed to start: %s" % scriptpath)
+        self.conn = Client(address, authkey=authkey)
+        kind, payload = self.conn.recv()
+        if kind != "ready":
+            self.close()
+            raise RuntimeError("Script worker failed to load %s: %s" % (scriptpath, payload))
+        self.catalog = payload
+    
+    def send (self, calls):
+        self.conn.send(("call", calls))
+    
+    def receive (self, timeout):
+        if not self.conn.poll(timeout):
+            raise ScriptTimeout()
+        kind, payload = self.conn.recv()
+        return payload
+    
+    def close (self):
+        try:
+            self.conn.send(("close", None))
+            self.conn.close()
+        except (AttributeError, OSError):
+            pass
+        try:
+            self.proc.wait(1)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+    
+    def kill (self):
+        self.proc.kill()
+        self.proc.wait()
+        self.conn.close()
+
+class ScriptPool (object):
+    """Pool of worker processes running one script module.
+    
+    timeout is per script call in seconds. A call that fails, times out or
+    takes its worker down raises RuntimeError in the caller, like a missing
+    script does."""
+    grace = 1.0
+    
+    def __init__ (self, scriptpath, workers=2, timeout=1.0):
+        self.scriptpath = scriptpath
+        self.size = max(1, workers)
+        self.timeout = timeout
+        self.workers = []
+        self.next = 0
+        self.memo = None
+        self.batchdepth = 0
+        self.resetstats()
+        self.start()
+        atexit.register(self.close)
+    
+    def start (self):
+        self.workers = [ScriptWorker(self.scriptpath, self.timeout) for i in range(self.size)]
+        self.catalog = self.workers[0].catalog
+    
+    def restart (self):
+        """Start fresh workers, picking up changes to the script module."""
+        self.close()
+        self.start()
+    
+    def close (self):
+        for worker in self.workers:
+            worker.close()
+        self.workers = []
+    
+    def proxies (self):
+        return {name: ScriptProxy(self, name, info) for name, info in self.catalog.items()}
+    
+    def resetstats (self):
+        self.calls = 0
+        self.roundtrips = 0
+        self.prefetched = 0
+        self.memohits = 0
+        self.timeouts = 0
+        self.crashes = 0
+        self.errors = 0
+        self.latency = Histogram()
+    
+    def stats (self):
+        return {"workers": len(self.workers), "calls": self.calls, 
+            "roundtrips": self.roundtrips, "prefetched": self.prefetched, 
+            "memohits": self.memohits, "timeouts": self.timeouts, "crashes": self.crashes, "errors": self.errors,
+            "latency": self.latency.todict()}
+    
+    def call (self, name, params):
+        self.calls += 1
+        key = (name, params)
+        if self.memo is not None and key in self.memo:
+            self.memohits += 1
+            result = self.memo[key]
+        else:
+            result = self.dispatch([key])[0]
+        return self.unwrap(name, result)
+    
+    def unwrap (self, name, result):
+        status, value = result
+        if status == "ok":
+            return value
+        elif status == "timeout":
+            raise RuntimeError("Script timed out: %s" % name)
+        elif status == "crashed":
+            raise RuntimeError("Script worker crashed running %s" % name)
+        else:
+            raise RuntimeError("Script %s failed: %s" % (name, value))
+    
+    @contextmanager
+    def batch (self, calls):
+        """Run calls, (name, params) pairs, in one round trip spread over
+        the workers, and answer them from the results until the block
+        ends. Calls are made whether or not the code in the block gets to
+        them, so this is only for scripts free of side effects, such as
+        conditions."""
+        if self.memo is None:
+            self.memo = dict()
+        self.batchdepth += 1
+        try:
+            todo = list(dict.fromkeys(c for c in calls if c not in self.memo))
+            if todo:
+                self.prefetched += len(todo)
+                self.memo.update(zip(todo, self.dispatch(todo)))
+            yield
+        finally:
+            self.batchdepth -= 1
+            if not self.batchdepth:
+                self.memo = None
+    
+    def dispatch (self, calls):
+        """Send calls to the workers in contiguous chunks and gather the
+        results in order."""
+        count = len(self.workers)
+        if len(calls) == 1:
+            chunks = [(self.workers[self.next % count], calls)]
+            self.next += 1
+        else:
+            size = -(-len(calls) // count)
+            chunks = [(self.workers[i], calls[i*size:(i+1)*size]) for i in range(count) 
+                if calls[i*size:(i+1)*size]]
+        start = time.perf_counter()
+        sent = []
+        for worker, chunk in chunks:
+            try:
+                worker.send(chunk)
+                sent.append(True)
+            except OSError:
+                sent.append(False)
+        results = []
+        for (worker, chunk), ok in zip(chunks, sent):
+            status = "crashed"
+            if ok:
+                try:
+                    results.extend(worker.receive(self.timeout*len(chunk) + self.grace))
+                    continue
+                except ScriptTimeout:
+                    status = "timeout"
+                except (EOFError, OSError):
+                    pass
+            self.replace(worker)
+            results.extend([(status, None)]*len(chunk))
+        self.roundtrips += 1
+        self.latency.add(time.perf_counter() - start)
+        self.timeouts += sum(1 for status, value in results if status == "timeout")
+        self.crashes += sum(1 for status, value in results if status == "crashed")
+        self.errors += sum(1 for status, value in results if status == "error")
+        return results
+    
+    def replace (self, worker):
+        worker.kill()
+        self.workers[self.workers.index(worker)] = ScriptWorker(self.scriptpath, self.timeout)
+
+def describe (scripts):
+    """Signatures of scripts in a form the parent can unpickle without
+    importing the script module: annotations and defaults that are not
+    builtins are passed as text."""
+    def portable (value):
+        if value is None or type(value) in (bool, int, float, str):
+            return value
+        if isinstance(value, type) and value.__module__ == "builtins":
+            return value
+        return getattr(value, "__name__", repr(value))
+    
+    catalog = dict()
+    for name, func in scripts.items():
+        try:
+            signature = inspect.signature(func)
+        except (TypeError, ValueError):
+            catalog[name] = ([], None, False)
+            continue
+        params = []
+        for param in signature.parameters.values():
+            if param.name == "self":
+                continue
+            annot = portable(param.annotation) if param.annotation is not param.empty else None
+            default = portable(param.default) if param.default is not param.empty else None
+            params.append((param.name, annot, default))
+        hasreturn = "return" in getattr(func, "__annotations__", {})
+        returns = portable(signature.return_annotation) if hasreturn else None
+        catalog[name] = (params, returns, hasreturn)
+    return catalog
+
+def runcall (scripts, name, params, timeout):
+    func = scripts.get(name, None)
+    if func is None:
+        return ("error", "Unknown script: %s" % name)
+    timer = hasattr(signal, "setitimer")
+    if timer:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return ("ok", func(*params))
+    except ScriptTimeout:
+        return ("timeout", None)
+    except Exception as e:
+        return ("error", repr(e))
+    finally:
+        if timer:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+def serve (scriptpath, timeout):
+    """Worker main loop: load the scripts, then run calls until the
+    connection closes."""
+    from flint.parsers.proj import importscripts
+    authkey = bytes.fromhex(sys.stdin.readline().strip())
+    listener = Listener(authkey=authkey)
+    print(listener.address, flush=True)
+    conn = listener.accept()
+    listener.close()
+    try:
+        scripts = importscripts(scriptpath)
+        conn.send(("ready", describe(scripts)))
+    except Exception as e:
+        conn.send(("error", repr(e)))
+        return
+    if hasattr(signal, "setitimer"):
+        def alarm (signum, frame):
+            raise ScriptTimeout()
+        signal.signal(signal.SIGALRM, alarm)
+    while True:
+        try:
+            kind, payload = conn.recv()
+        except (EOFError, OSError):
+            break
+        if kind == "close":
+            break
+        results = [runcall(scripts, name, params, timeout) for name, params in payload]
+        try:
+            conn.send(("results", results))
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            conn.send(("results", [r if r[0] != "ok" else ("error", "Result not picklable: %r" % e) 
+                for r in results]))
+
+if __name__ == "__main__":
+    serve(sys.argv[1], float(sys.argv[2]))
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Per-script call counts and latencies.
+
+A ScriptProfiler swaps timing wrappers into script registries, so every
+way a script gets called is covered: interpreted and compiled conditions,
+script lists, and proxies into a ScriptPool. ConvPlayer tells the profiler
+which node it is working on, which attributes each call to a node as well
+as to a script.
+
+Run as a module for a report over random playthroughs:
+
+    python3 -m flint.scriptprofile game.proj --steps 10000 --seed 1
+"""
+
+import argparse
+import functools
+import json
+import random
+import time
+from array import array
+
+class CallStats (object):
+    """Latencies of one script or node. Samples are kept as doubles for
+    exact percentiles, 8 bytes a call."""
+    def __init__ (self):
+        self.samples = array('d')
+        self.total = 0.0
+    
+    def add (self, duration):
+        self.samples.append(duration)
+        self.total += duration
+    
+    def todict (self):
+        samples = sorted(self.samples)
+        count = len(samples)
+        def pick (p):
+            return samples[min(count-1, int(p*count))]
+        return {"count": count, "total": self.total, "mean": self.total/count,
+            "p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99), "max": samples[-1]}
+
+class ScriptProfiler (object):
+    def __init__ (self):
+        self.registries = []
+        self.node = None
+        self.reset()
+    
+    def reset (self):
+        self.scripts = dict()
+        self.nodes = dict()
+    
+    def attach (self, registry):
+        """Start timing the scripts of registry. A reload of the scripts
+        while attached replaces the wrappers; attach again after one."""
+        for entry in self.registries:
+            if entry[0] is registry:
+                if entry[2] == registry.version:
+                    return
+                self.registries.remove(entry)
+                break
+        table = registry.table
+        registry.swap({name: self.wrap(name, func) for name, func in table.items()})
+        self.registries.append((registry, table, registry.version))
+    
+    def detach (self):
+        """Put back the tables saved at attach. A registry whose scripts
+        were reloaded since holds no wrappers and is left as it is."""
+        for registry, table, version in self.registries:
+            if registry.version == version:
+                registry.swap(table)
+        self.registries = []
+    
+    def wrap (self, name, func):
+        perf_counter = time.perf_counter
+        
+        @functools.wraps(func)
+        def timed (*params):
+            start = perf_counter()
+            try:
+                return func(*params)
+            finally:
+                self.record(name, perf_counter() - start)
+        return timed
+    
+    def record (self, name, duration):
+        stats = self.scripts.get(name)
+        if stats is None:
+            stats = self.scripts[name] = CallStats()
+        stats.add(duration)
+        stats = self.nodes.get(self.node)
+        if stats is None:
+            stats = self.nodes[self.node] = CallStats()
+        stats.add(duration)
+    
+    def report (self):
+        """Stats per script name and per node, each sorted by total time.
+        Nodes are keyed "conversation:ID"; calls made outside a node check
+        or node scripts are filed under "-"."""
+        def nodekey (node):
+            return "-" if node is None else "%s:%s" % node
+        
+        def bytotal (items):
+            return dict(sorted(items, key=lambda item: item[1]["total"], reverse=True))
+        
+        return {"scripts": bytotal((name, s.todict()) for name, s in self.scripts.items()),
+            "nodes": bytotal((nodekey(node), s.todict()) for node, s in self.nodes.items())}
+    
+    def formatreport (self, top=20):
+        report = self.report()
+        lines = []
+        for title, entries in (("script", report["scripts"]), ("node", report["nodes"])):
+            lines.append("%-32s %9s %11s %11s %11s %11s" % (title, "calls", "total ms", 
+                "p50 us", "p99 us", "max us"))
+            for name, s in list(entries.items())[:top]:
+                lines.append("%-32s %9d %11.3f %11.1f %11.1f %11.1f" % (name, s["count"],
+                    s["total"]*1e3, s["p50"]*1e6, s["p99"]*1e6, s["max"]*1e6))
+            lines.append("")
+        return "\n".join(lines)
+
+def playthrough (player, convs, steps, seed=0):
+    """Random walk through convs, restarting whenever a conversation ends.
+    Returns the number of conversations started."""
+    player.random.seed(seed)
+    rng = random.Random(seed)
+    starts = 0
+    for step in range(steps):
+        if player.currentnode is None:
+            player.startconv(rng.choice(convs))
+            starts += 1
+            continue
+        choices = [nd for nd in player.nextlist if nd.visible] if player.nextlist else []
+        player.setcurrentnode(rng.choice(choices) if choices else None)
+    return starts
+
+def main ():
+    from flint.conv_player import ConvPlayer
+    parser = argparse.ArgumentParser(prog="python3 -m flint.scriptprofile",
+        description="Profile project scripts over random playthroughs.")
+    parser.add_argument("project", help="project file")
+    parser.add_argument("convs", nargs="*", help="conversations to play (default: all)")
+    parser.add_argument("--steps", type=int, default=1000, help="player steps (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)s)")
+    parser.add_argument("--top", type=int, default=20, help="rows per table (default: %(default)s)")
+    parser.add_argument("--json", help="write the full report to this file")
+    args = parser.parse_args()
+    
+    player = ConvPlayer(args.project)
+    convs = args.convs or player.proj.convs
+    if not convs:
+        parser.error("project has no conversations")
+    profiler = player.profile()
+    start = time.perf_counter()
+    starts = playthrough(player, convs, args.steps, args.seed)
+    elapsed = time.perf_counter() - start
+    profiler.detach()
+    
+    print("%d steps, %d conversations, %.3f s" % (args.steps, starts, elapsed))
+    print()
+    print(profiler.formatreport(args.top))
+    if args.json:
+        report = profiler.report()
+        report.update(steps=args.steps, conversations=starts, elapsed=elapsed)
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
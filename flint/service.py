@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Dialogue as a local network service.
+
+A DialogueService plays conversations of one project for many clients at
+once. Clients connect over TCP and send one JSON object per line, getting
+one back per line, in order:
+
+    {"op": "create", "conv": "intro.conv", "seed": 1}
+        -> {"ok": true, "session": 1, "events": [...], "ended": false}
+    {"op": "step", "session": 1, "choice": 0}
+        -> {"ok": true, "events": [...], "ended": false}
+    {"op": "state", "session": 1}
+    {"op": "close", "session": 1}
+    {"op": "stats"}
+
+Events are PlayerEvent.todict()s. An "id" in a request is copied into its
+reply; errors come back as {"ok": false, "error": "..."}. Sessions belong
+to their connection and end with it. Conversations are loaded once and
+shared by every session.
+
+Each connection is served one request at a time, and the next line is only
+read once the reply has been written out, so a client that sends faster
+than it reads is held back by TCP itself. Connections and sessions past the
+limits are turned away with an error.
+
+Requests are handled on the event loop thread, one at a time across all
+connections: the sessions share the conversations and the project's
+scripts, and a ScriptPool is not safe to use from several threads. A slow
+script therefore holds up every client for as long as it runs, up to the
+pool's timeout. Run several services to use more than one core.
+
+Run a server, or a load generator against one, with:
+
+    python3 -m flint.service serve project.proj [--port 7337]
+    python3 -m flint.service load intro.conv [--clients 16 --steps 500]"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import flint.parsers.conv as cp
+import flint.parsers.proj as pp
+from flint.conv_player import ConvPlayer
+from flint.trace import Histogram
+
+class SessionPlayer (ConvPlayer):
+    """ConvPlayer on the project and conversations of a service."""
+    def __init__ (self, service, seed=None):
+        self.service = service
+        super().__init__(service.proj.filename, seed)
+    
+    def loadproj (self, projfile):
+        return self.service.proj
+    
+    def readconv (self, abspath):
+        return self.service.readconv(abspath)
+
+def exportstate (player):
+    """Where a player is and what it has seen, JSON-ready."""
+    return {"conv": player.currentconv, 
+        "node": player.currentnode.ids if player.currentnode is not None else None,
+        "choices": [nd.ids for nd in player.choices()],
+        "persisttemp": sorted(player.persisttemp),
+        "persistperm": {conv: sorted(IDs) for conv, IDs in player.persistperm.items()},
+        "steps": player.steps}
+
+class DialogueService (object):
+    def __init__ (self, projfile, maxconnections=64, maxsessions=4096, maxline=1 << 16, **options):
+        self.proj = pp.loadjson(projfile, **options)
+        self.convs = dict()
+        self.maxconnections = maxconnections
+        self.maxsessions = maxsessions
+        self.maxline = maxline
+        self.connections = 0
+        self.sessions = 0
+        self.nextID = 1
+        self.counts = {"requests": 0, "errors": 0, "refused": 0}
+        self.latency = Histogram()
+        self.ops = {"create": self.create, "step": self.step, "state": self.state,
+            "close": self.close, "stats": self.stats}
+    
+    def readconv (self, abspath):
+        if abspath not in self.convs:
+            self.convs[abspath] = cp.loadjson(abspath, self.proj)
+        return self.convs[abspath]
+    
+    async def start (self, host="127.0.0.1", port=7337):
+        return await asyncio.start_server(self.handle, host, port, limit=self.maxline)
+    
+    async def handle (self, reader, writer):
+        if self.connections >= self.maxconnections:
+            self.counts["refused"] += 1
+            writer.write(b'{"ok": false, "error": "Too many connections"}\n')
+            await self.shut(writer)
+            return
+        self.connections += 1
+        sessions = dict()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(b'{"ok": false, "error": "Request too long"}\n')
+                    break
+                if not line:
+                    break
+                writer.write(json.dumps(self.request(line, sessions)).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            self.sessions -= len(sessions)
+            for stream in sessions.values():
+                stream.close()
+            await self.shut(writer)
+    
+    async def shut (self, writer):
+        try:
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+    
+    def request (self, line, sessions):
+        start = time.perf_counter()
+        self.counts["requests"] += 1
+        reqID = None
+        try:
+            args = json.loads(line)
+            if not isinstance(args, dict):
+                raise ValueError("Request is not an object")
+            reqID = args.pop("id", None)
+            op = args.pop("op", None)
+            if op not in self.ops:
+                raise ValueError("Unknown op: %s" % op)
+            reply = self.ops[op](sessions, **args)
+            reply["ok"] = True
+        except Exception as e: # bad requests, and anything a project script raises
+            self.counts["errors"] += 1
+            message = e.args[0] if len(e.args) == 1 else e # KeyError quotes its str()
+            reply = {"ok": False, "error": "%s: %s" % (type(e).__name__, message)}
+        if reqID is not None:
+            reply["id"] = reqID
+        self.latency.add(time.perf_counter() - start)
+        return reply
+    
+    def session (self, sessions, session):
+        if session not in sessions:
+            raise KeyError("Unknown session: %s" % session)
+        return sessions[session]
+    
+    def events (self, stream):
+        return {"events": [event.todict() for event in stream], "ended": stream.ended()}
+    
+    def create (self, sessions, conv, seed=None):
+        if self.sessions >= self.maxsessions:
+            raise RuntimeError("Too many sessions")
+        stream = SessionPlayer(self, seed).stream(conv)
+        sessionID = self.nextID
+        self.nextID += 1
+        sessions[sessionID] = stream
+        self.sessions += 1
+        reply = self.events(stream)
+        reply["session"] = sessionID
+        return reply
+    
+    def step (self, sessions, session, choice=None):
+        stream = self.session(sessions, session)
+        if choice is not None and (not isinstance(choice, int) or isinstance(choice, bool)):
+            raise ValueError("Choice is not an index: %s" % choice)
+        stream.choose(choice)
+        return self.events(stream)
+    
+    def state (self, sessions, session):
+        return exportstate(self.session(sessions, session).player)
+    
+    def close (self, sessions, session):
+        self.session(sessions, session).close()
+        del sessions[session]
+        self.sessions -= 1
+        return {}
+    
+    def stats (self, sessions):
+        stats = dict(self.counts, connections=self.connections, sessions=self.sessions)
+        stats["latency"] = self.latency.todict()
+        return stats
+
+async def playthroughs (host, port, conv, steps, seed, scripted=None):
+    """One client: play conv over a connection for steps steps, starting
+    a new session whenever one ends. Choices come from scripted, a list
+    of choice indices per playthrough, replayed in turn, or at random.
+    Returns the round trip time of every step."""
+    reader, writer = await asyncio.open_connection(host, port, limit=1 << 24) # replies list every choice
+    rng = random.Random(seed)
+    latencies = []
+    
+    async def send (**request):
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        reply = json.loads(await reader.readline())
+        if not reply["ok"]:
+            raise RuntimeError(reply["error"])
+        return reply
+    
+    try:
+        session = None
+        run = 0
+        while len(latencies) < steps:
+            if session is None:
+                reply = await send(op="create", conv=conv, seed=rng.randrange(1 << 30))
+                session = reply["session"]
+                script = iter(scripted[run % len(scripted)]) if scripted else None
+                run += 1
+                if reply["ended"]:
+                    raise RuntimeError("%s ends before any choice" % conv)
+            if reply["ended"]:
+                await send(op="close", session=session)
+                session = None
+                continue
+            if script is not None:
+                choice = next(script, None)
+            else:
+                choices = [event["choices"] for event in reply["events"] if event["kind"] == "choices"]
+                choice = rng.randrange(len(choices[-1])) if choices and choices[-1] else None
+            start = time.perf_counter()
+            reply = await send(op="step", session=session, choice=choice)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return latencies
+
+async def loadtest (host, port, conv, clients=16, steps=500, seed=0, scripted=None):
+    """Run clients playthroughs() side by side. Returns throughput in
+    steps per second and step latency percentiles in seconds."""
+    start = time.perf_counter()
+    results = await asyncio.gather(*(playthroughs(host, port, conv, steps, seed+i, scripted) 
+        for i in range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(l for result in results for l in result)
+    count = len(latencies)
+    def pick (p):
+        return latencies[min(count-1, int(p*count))]
+    return {"clients": clients, "steps": count, "elapsed": elapsed, 
+        "throughput": count/elapsed, "p50": pick(0.5), "p99": pick(0.99), "max": latencies[-1]}
+
+def main ():
+    parser = argparse.ArgumentParser(prog="python3 -m flint.service",
+        description="Serve project conversations over TCP, or load test a server.")
+    parser.add_argument("--host", default="127.0.0.1", help="address (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=7337, help="port (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="run a server")
+    serve.add_argument("project", help="project file")
+    serve.add_argument("--maxconnections", type=int, default=64, help="(default: %(default)s)")
+    serve.add_argument("--maxsessions", type=int, default=4096, help="(default: %(default)s)")
+    serve.add_argument("--scriptworkers", type=int, default=0, 
+        help="run scripts in this many worker processes (default: in process)")
+    serve.add_argument("--scripttimeout", type=float, default=1.0, 
+        help="seconds a script call may take in a worker (default: %(default)s)")
+    load = commands.add_parser("load", help="replay playthroughs against a server")
+    load.add_argument("conv", help="conversation to play")
+    load.add_argument("--clients", type=int, default=16, help="connections (default: %(default)s)")
+    load.add_argument("--steps", type=int, default=500, help="steps per client (default: %(default)s)")
+    load.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)s)")
+    load.add_argument("--playthroughs", help="JSON file with a list of choice index lists to replay")
+    args = parser.parse_args()
+    
+    if args.command == "serve":
+        service = DialogueService(args.project, args.maxconnections, args.maxsessions,
+            scriptworkers=args.scriptworkers, scripttimeout=args.scripttimeout)
+        async def serveforever ():
+            server = await service.start(args.host, args.port)
+            print("Serving %s on %s:%d" % (args.project, args.host, args.port), file=sys.stderr)
+            async with server:
+                await server.serve_forever()
+        try:
+            asyncio.run(serveforever())
+        except KeyboardInterrupt:
+            pass
+    else:
+        scripted = None
+        if args.playthroughs:
+            with open(args.playthroughs, 'r') as f:
+                scripted = json.load(f)
+        result = asyncio.run(loadtest(args.host, args.port, args.conv, args.clients, 
+            args.steps, args.seed, scripted))
+        print("%d clients, %d steps in %.2f s: %.0f steps/s, p50 %.3f ms, p99 %.3f ms" % (
+            result["clients"], result["steps"], result["elapsed"], result["throughput"], 
+            result["p50"]*1e3, result["p99"]*1e3))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2015, 2016 Justas Lavišius
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Lightweight tracing: nested timing spans, counters and histograms.
+
+Tracing is off by default and every entry point checks FlTrace.enabled
+first, so instrumented code pays for little more than a function call.
+Recorded spans can be exported as Chrome trace-event JSON (chrome://tracing,
+Perfetto) with writetrace()."""
+
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+class FlTrace:
+    enabled = False
+    events = []
+    counters = dict()
+    histograms = dict()
+    start = time.perf_counter()
+
+class Histogram (object):
+    """Running summary with power-of-two buckets, so memory stays constant."""
+    def __init__ (self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.buckets = dict()
+    
+    def add (self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        bucket = math.frexp(value)[1] if value > 0 else 0
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+    
+    def todict (self):
+        return {"count": self.count, "total": self.total, "min": self.min,
+            "max": self.max, "mean": self.total/self.count if self.count else None,
+            "buckets": {str(2**b): n for b, n in sorted(self.buckets.items())} }
+
+class Span (object):
+    __slots__ = ("name", "cat", "args", "begin")
+    
+    def __init__ (self, name, cat, args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+    
+    def __enter__ (self):
+        self.begin = time.perf_counter()
+        return self
+    
+    def __exit__ (self, *exc):
+        end = time.perf_counter()
+        duration = end - self.begin
+        event = {"name": self.name, "cat": self.cat, "ph": "X", 
+            "ts": (self.begin - FlTrace.start)*1e6, "dur": duration*1e6,
+            "pid": os.getpid(), "tid": threading.get_ident()}
+        if self.args:
+            event["args"] = self.args
+        FlTrace.events.append(event)
+        observe("%s.duration" % self.name, duration)
+
+class NullSpan (object):
+    __slots__ = ()
+    
+    def __enter__ (self):
+        return self
+    
+    def __exit__ (self, *exc):
+        pass
+
+nullspan = NullSpan()
+
+def enable (enabled=True):
+    FlTrace.enabled = enabled
+
+def reset ():
+    FlTrace.events = []
+    FlTrace.counters = dict()
+    FlTrace.histograms = dict()
+    FlTrace.start = time.perf_counter()
+
+def span (name, cat="flint", **args):
+    """Context manager timing the enclosed block. Spans nest by time."""
+    if not FlTrace.enabled:
+        return nullspan
+    return Span(name, cat, args)
+
+def traced (name=None, cat="flint"):
+    """Decorator wrapping every call of the function in a span."""
+    def decorate (func):
+        spanname = name or func.__qualname__
+        @functools.wraps(func)
+        def wrapper (*args, **kwargs):
+            if not FlTrace.enabled:
+                return func(*args, **kwargs)
+            with Span(spanname, cat, None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count (name, value=1):
+    if not FlTrace.enabled:
+        return
+    total = FlTrace.counters.get(name, 0) + value
+    FlTrace.counters[name] = total
+    FlTrace.events.append({"name": name, "ph": "C", 
+        "ts": (time.perf_counter() - FlTrace.start)*1e6, 
+        "pid": os.getpid(), "args": {"value": total}})
+
+def observe (name, value):
+    if not FlTrace.enabled:
+        return
+    if name not in FlTrace.histograms:
+        FlTrace.histograms[name] = Histogram()
+    FlTrace.histograms[name].add(value)
+
+def summary ():
+    return {"counters": dict(FlTrace.counters), "histograms": 
+        {name: h.todict() for name, h in FlTrace.histograms.items()} }
+
+def writetrace (filename):
+    with open(filename, 'w') as f:
+        json.dump({"traceEvents": FlTrace.events, "displayTimeUnit": "ms",
+            "otherData": summary()}, f)
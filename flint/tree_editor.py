@@ -16,12 +16,35 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from collections import deque, OrderedDict
+from contextlib import contextmanager
+import sys
+import time
 from PyQt5.QtGui import QTextDocument
 from PyQt5.QtWidgets import QPlainTextDocumentLayout
+import flint.parsers.conv as cp
 from flint.glob import log
+from flint.trace import traced
+
+def approxsize (obj, depth=3):
+    """Rough memory footprint of obj and what it holds, depth levels down."""
+    size = sys.getsizeof(obj)
+    if depth:
+        if isinstance(obj, dict):
+            items = obj.values()
+        elif isinstance(obj, (list, tuple, set)):
+            items = obj
+        elif hasattr(obj, "__dict__") and not callable(obj):
+            items = (obj.__dict__,)
+        else:
+            items = ()
+        size += sum(approxsize(item, depth-1) for item in items)
+    return size
 
 class HistoryAction (object):
+    __slots__ = ("unfunc", "unargs", "refunc", "reargs", "descr", "time")
+    
     def __init__ (self, unfunc, unargs, refunc, reargs, descr):
+        self.time = time.monotonic()
         self.unfunc = unfunc
         self.unargs = unargs.copy()
         self.unargs["undo"] = True
@@ -31,12 +54,70 @@ class HistoryAction (object):
         self.descr = descr
     
     def undo (self):
-        log("debug", "UNDO %s(%s)" % (self.unfunc.__name__, self.unargs))
+        log("debug", "UNDO %s(%s)", self.unfunc.__name__, self.unargs)
         self.unfunc(**self.unargs)
     
     def redo (self):
-        log("debug", "REDO %s(%s)" % (self.refunc.__name__, self.reargs))
+        log("debug", "REDO %s(%s)", self.refunc.__name__, self.reargs)
         self.refunc(**self.reargs)
+    
+    def size (self):
+        return sys.getsizeof(self) + approxsize(self.unargs) + approxsize(self.reargs)
+
+class HistoryGroup (object):
+    """Several actions recorded by one transaction, undone as one step."""
+    def __init__ (self, actions, descr):
+        self.actions = actions
+        self.descr = descr
+    
+    def undo (self):
+        for action in reversed(self.actions):
+            action.undo()
+    
+    def redo (self):
+        for action in self.actions:
+            action.redo()
+    
+    def size (self):
+        return sys.getsizeof(self) + sum(action.size() for action in self.actions)
+
+class HistoryStack (object):
+    """Undo or redo stack bounded by the approximate memory held by its
+    actions instead of their number. The newest action is always kept.
+    
+    Supports the parts of the deque interface the editor uses."""
+    def __init__ (self, budget):
+        self.budget = budget
+        self.actions = deque()
+        self.sizes = deque()
+        self.size = 0
+    
+    def appendleft (self, action):
+        size = action.size()
+        self.actions.appendleft(action)
+        self.sizes.appendleft(size)
+        self.size += size
+        while self.size > self.budget and len(self.actions) > 1:
+            self.actions.pop()
+            self.size -= self.sizes.pop()
+    
+    def popleft (self):
+        self.size -= self.sizes.popleft()
+        return self.actions.popleft()
+    
+    def clear (self):
+        self.actions.clear()
+        self.sizes.clear()
+        self.size = 0
+    
+    def __len__ (self):
+        return len(self.actions)
+    
+    def __getitem__ (self, index):
+        return self.actions[index]
+    
+    def __iter__ (self):
+        return iter(self.actions)
 
 class TreeEditor (object):
     def __init__ (self, nodecontainer):
@@ -46,16 +127,20 @@ class TreeEditor (object):
         self.collapsednodes = []
         self.nodedocs = dict()
         self.hits = None
+        self.transactiondepth = 0
+        self.transactionactions = []
         
-        historysize = 10 # OPTION
-        self.undohistory = deque(maxlen=historysize)
-        self.redohistory = deque(maxlen=historysize)
+        historybudget = 1 << 24 # OPTION: bytes per history stack
+        self.coalescetime = 1.0 # OPTION: seconds between merged field edits
+        self.undohistory = HistoryStack(historybudget)
+        self.redohistory = HistoryStack(historybudget)
     
+    @traced()
     def traverse (self):
         queue = deque()
         # queue element: (fromID, toID, state)
         # state:         None: auto, 1: normal, 0: ghost, -1: hidden
-        queue.append((None, "0", None))
+        queue.append((None, 0, None))
         nodes = self.nodecontainer.nodes
         visitlog = dict()
         neworder = OrderedDict()
@@ -134,11 +219,12 @@ class TreeEditor (object):
         for fullID in toremove:
             changes.append(("removeitem", (fullID,)))
         
-        log("debug", "CHANGES %s" % changes)
+        log("debug", "CHANGES %s", changes)
         self.trash = nodes - visitlog.keys()
         self.changes.extend(changes)
         self.nodeorder = neworder
     
+    @traced()
     def updatedocs (self):
         newnodedocs = dict()
         for nodeID, nodeobj in self.nodecontainer.nodes.items():
@@ -159,37 +245,42 @@ class TreeEditor (object):
                 for s in ("enterscripts", "exitscripts", "condition"):
                     scriptdoc = QTextDocument(self)
                     scriptdoc.setDocumentLayout(QPlainTextDocumentLayout(scriptdoc))
-                    scriptdoc.setPlainText(self.scripttotext(nodeobj.__dict__[s]))
+                    scriptdoc.setPlainText(cp.scripttotext(getattr(nodeobj, s)))
                     newnodedocs[nodeID][s] = scriptdoc
         self.nodedocs = newnodedocs
     
-    def scripttotext (self, script):
-        def calltotext (call):
-            text = ""
-            if call.typename == "script":
-                text += call.funcname
-                paramstr = []
-                for p in call.funcparams:
-                    if isinstance(p, str):
-                        paramstr.append('"%s"' % p)
-                    else:
-                        paramstr.append('%s' % p)
-                text += "(%s)" % ", ".join(paramstr)
-            elif call.typename == "wrap":
-                text += "["
-                text += " {op} ".format(op=call.operatorname).join(calltotext(c) for c in call.calls)
-                text += "]"
-            return text
-        
-        if isinstance(script, list):
-            return "; ".join(calltotext(c) for c in script)
-        else:
-            return calltotext(script)
-    
     def addundoable (self, hist):
+        if self.transactiondepth:
+            self.transactionactions.append(hist)
+            return
         self.undohistory.appendleft(hist)
         self.redohistory.clear()
     
+    @contextmanager
+    def transaction (self, descr):
+        """Group edits into a single undo step.
+        
+        Transactions nest; only the outermost one records the group and
+        calls commit(). Edits made before an exception are kept and are
+        still recorded, so they can be undone."""
+        self.transactiondepth += 1
+        try:
+            yield self
+        finally:
+            self.transactiondepth -= 1
+            if not self.transactiondepth:
+                actions = self.transactionactions
+                self.transactionactions = []
+                if len(actions) == 1:
+                    self.addundoable(actions[0])
+                elif actions:
+                    self.addundoable(HistoryGroup(actions, descr))
+                self.commit()
+    
+    def commit (self):
+        """Called when the outermost transaction ends."""
+        pass
+    
     def linknode (self, nodeID, refID, pos=None, undo=False):
         self.nodecontainer.newlink(refID, nodeID, pos)
         
@@ -201,9 +292,26 @@ class TreeEditor (object):
                 "Link node %s to node %s" % (nodeID, refID))
             self.addundoable(hist)
     
+    def pastesubtree (self, nodeID, refID, source=None, undo=False):
+        """Link a copy of the subtree of nodeID, from source or this
+        conversation, to refID."""
+        idmap = self.nodecontainer.clonesubtree(nodeID, source)
+        newid = idmap[nodeID]
+        self.nodecontainer.newlink(refID, newid)
+        
+        if not undo:
+            hist = HistoryAction(self.unlink,
+                {"nodeID": newid, "refID": refID},
+                self.linknode,
+                {"nodeID": newid, "refID": refID},
+                "Paste copy of subtree %s (%s nodes) to node %s" % (nodeID, len(idmap), refID))
+            self.addundoable(hist)
+        return newid
+    
     def linksubnode (self, subID, bankID, pos, undo=False):
         """Only called as Undo action, assume sane arguments."""
         self.nodecontainer.nodes[bankID].subnodes.insert(pos, subID)
+        self.nodecontainer.reindex(bankID)
     
     def addnode (self, nodeID, typename="", ndict=None, undo=False):
         if ndict is not None:
@@ -270,11 +378,11 @@ class TreeEditor (object):
                 subbanks.extend([nodes[subID] for subID in subbank.subnodes if nodes[subID].typename == "bank"])
     
     def unlink (self, nodeID, refID, undo=False):
-        nodeitem = self.itembyID(nodeID)
         cont = self.nodecontainer
         refnode = cont.nodes[refID]
         pos = refnode.linkIDs.index(nodeID)
         refnode.linkIDs.remove(nodeID)
+        cont.reindex(refID)
         
         if not undo:
             hist = HistoryAction(self.linknode, {"nodeID": nodeID, "refID": refID, "pos": pos},
@@ -286,6 +394,7 @@ class TreeEditor (object):
         cont = self.nodecontainer
         pos = cont.nodes[bankID].subnodes.index(subID)
         cont.nodes[bankID].subnodes.remove(subID)
+        cont.reindex(bankID)
         
         if not undo:
             hist = HistoryAction(
@@ -307,6 +416,7 @@ class TreeEditor (object):
                 inherited.append(orphan)
                 refnode.linkIDs.insert(index, orphan)
                 index += 1
+        cont.reindex(refID)
         
         if not undo:
             hist = HistoryAction(self.undoinherit,
@@ -321,6 +431,7 @@ class TreeEditor (object):
         ref = cont.nodes[refID]
         for childID in inherited:
             ref.linkIDs.remove(childID)
+        cont.reindex(refID)
         cont.newlink(refID, nodeID, pos)
     
     def move (self, nodeID, refID, up, undo=False):
@@ -349,7 +460,7 @@ class TreeEditor (object):
             self.addundoable(hist)
     
     def parentswap (self, gpID, parID, nodeID, pos=None, undo=False):
-        log("debug", "PARENSTSWAP %s" % str((gpID, parID, nodeID, pos, undo)))
+        log("debug", "PARENSTSWAP %s", (gpID, parID, nodeID, pos, undo))
         nodes = self.nodecontainer.nodes
         parlinks = nodes[parID].linkIDs
         childlinks = nodes[nodeID].linkIDs
@@ -360,7 +471,7 @@ class TreeEditor (object):
         parlinks.insert(childindex, parID)
         
         if pos is not None:
-            log("debug", "- duplicate -> pos: %s; gplinks: %s" % (pos, grandpalinks))
+            log("debug", "- duplicate -> pos: %s; gplinks: %s", pos, grandpalinks)
             parindex = pos
             grandpalinks.insert(pos, parID)
         else:
@@ -375,6 +486,7 @@ class TreeEditor (object):
         
         nodes[parID].linkIDs = childlinks
         nodes[nodeID].linkIDs = parlinks
+        self.nodecontainer.reindex(gpID, parID, nodeID)
         
         if not undo:
             hist = HistoryAction(self.parentswap,
@@ -402,6 +514,7 @@ class TreeEditor (object):
             subID = newobj.ID
         else:
             cont.nodes[nodeID].subnodes.insert(0, subID)
+            cont.reindex(nodeID)
         
         self.nodedocs[subID] = self.nodedocs[nodeID]
         self.nodedocs.pop(nodeID)
@@ -444,6 +557,7 @@ class TreeEditor (object):
         else:
             newID = splitID
         selnode.linkIDs = [newID]
+        cont.reindex(nodeID)
         
         if not undo:
             hist = HistoryAction(
@@ -511,16 +625,85 @@ class TreeEditor (object):
                         hits.append(nodeID)
             self.hits = hits
     
-    def removenodes (self, nodeIDs):
+    def setfield (self, nodeID, field, value, undo=False):
+        """Set a plain node attribute, keeping its text document in sync.
+        
+        Consecutive edits of the same field within coalescetime seconds are
+        merged into one undo step."""
+        nodeobj = self.nodecontainer.nodes[nodeID]
+        oldvalue = getattr(nodeobj, field)
+        if value == oldvalue:
+            return
+        setattr(nodeobj, field, value)
+        self.syncdoc(nodeID, field, value)
+        if not undo:
+            self.addedit(self.setfield, nodeID, field, oldvalue, value)
+    
+    def setscript (self, nodeID, field, value, undo=False):
+        """Replace the condition, enter or exit scripts of a node with those
+        parsed from the text in value. Raises RuntimeError and leaves the node as it was
+        if the text does not parse or calls scripts the project lacks."""
+        nodeobj = self.nodecontainer.nodes[nodeID]
+        proj = self.nodecontainer.proj
+        scripts = proj.scripts if proj is not None else None
+        script = cp.parsescript(value, scripts, field)
+        oldvalue = cp.scripttotext(getattr(nodeobj, field))
+        if cp.scripttotext(script) == oldvalue:
+            return
+        if scripts is not None:
+            if field == "condition":
+                scripts.validate(script.scriptnames())
+            else:
+                scripts.validate(call.funcname for call in script)
+        setattr(nodeobj, field, script)
+        nodeobj.invalidatescripts()
+        self.syncdoc(nodeID, field, value)
+        if not undo:
+            self.addedit(self.setscript, nodeID, field, oldvalue, value)
+    
+    def syncdoc (self, nodeID, field, text):
+        doc = self.nodedocs.get(nodeID, {}).get(field, None)
+        if doc is not None and doc.toPlainText() != text:
+            doc.setPlainText(text)
+    
+    def addedit (self, func, nodeID, field, oldvalue, value):
+        """Record func(nodeID, field, value) as undoable. Consecutive edits of
+        the same field within coalescetime seconds are merged into one."""
+        now = time.monotonic()
+        last = self.undohistory[0] if self.undohistory else None
+        if (not self.transactiondepth and isinstance(last, HistoryAction) and 
+                last.refunc == func and last.reargs["nodeID"] == nodeID and 
+                last.reargs["field"] == field and now - last.time < self.coalescetime):
+            hist = self.undohistory.popleft()
+            if value != hist.unargs["value"]:
+                hist.reargs["value"] = value
+                hist.time = now
+                self.addundoable(hist)
+            return
+        hist = HistoryAction(func,
+            {"nodeID": nodeID, "field": field, "value": oldvalue},
+            func,
+            {"nodeID": nodeID, "field": field, "value": value},
+            "Edit %s of node %s" % (field, nodeID))
+        self.addundoable(hist)
+    
+    def removenodes (self, nodeIDs, undo=False):
+        removed = dict()
         for nodeID in nodeIDs:
-            self.nodecontainer.nodes.pop(nodeID)
-            self.nodedocs.pop(nodeID)
-        self.undohistory.clear()
-        self.redohistory.clear()
+            removed[nodeID] = self.nodecontainer.nodes.pop(nodeID)
+            self.nodedocs.pop(nodeID, None)
+        self.nodecontainer.reindex(*removed)
+        
+        if not undo:
+            hist = HistoryAction(self.restorenodes, {"nodes": removed},
+                self.removenodes, {"nodeIDs": list(removed)},
+                "Remove nodes %s" % ", ".join(str(ID) for ID in sorted(removed)))
+            self.addundoable(hist)
+    
+    def restorenodes (self, nodes, undo=False):
+        """Only called as Undo action, assume sane arguments."""
+        self.nodecontainer.nodes.update(nodes)
+        self.nodecontainer.reindex(*nodes)
     
     def removetrash (self):
-        for nodeID in self.trash:
-            self.nodecontainer.nodes.pop(nodeID)
-            self.nodedocs.pop(nodeID)
-        self.undohistory.clear()
-        self.redohistory.clear()
+        self.removenodes(list(self.trash))